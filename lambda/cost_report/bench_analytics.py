@@ -0,0 +1,60 @@
+# bench_analytics.py
+"""Compare the pure-Python and NumPy analytics backends on mock cost history
+
+Usage: python bench_analytics.py [days] [repeats]
+"""
+import json
+import random
+import sys
+import timeit
+
+from cost_analytics import PythonAnalytics, NumpyAnalytics, np, summarize
+from cost_series import build_cost_series
+from generate_mock_costs import build_dataset
+
+
+def per_group_columns(dataset):
+    """One daily cost column per (service, account) pair from Details"""
+    columns = {}
+    for day_index, result in enumerate(dataset["ResultsByTime"]):
+        for row in result.get("Details", ()):
+            key = (row["Service"], row["Account"])
+            column = columns.setdefault(key, [0.0] * len(dataset["ResultsByTime"]))
+            column[day_index] += float(row["Total"]["BlendedCost"]["Amount"])
+    return list(columns.values())
+
+
+def bench(backend, total, columns, repeats):
+    total_time = timeit.timeit(lambda: summarize(total, backend), number=repeats) / repeats
+    group_time = timeit.timeit(
+        lambda: [summarize(column, backend) for column in columns], number=repeats
+    ) / repeats
+    return {
+        "backend": backend.name,
+        "total_series_ms": round(total_time * 1000, 3),
+        "per_group_ms": round(group_time * 1000, 3),
+        "groups": len(columns),
+    }
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 730
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    random.seed(42)
+    dataset = build_dataset(days=days)
+    total = build_cost_series(dataset["ResultsByTime"]).amounts
+    columns = per_group_columns(dataset)
+
+    backends = [PythonAnalytics()]
+    if np is not None:
+        backends.append(NumpyAnalytics())
+    else:
+        print("⚠️ NumPy not installed, benchmarking the pure-Python backend only", file=sys.stderr)
+
+    results = [bench(backend, total, columns, repeats) for backend in backends]
+    print(json.dumps({"days": days, "repeats": repeats, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# bench_handler.py
+"""End-to-end benchmark of handler.lambda_handler against local stand-ins
+
+S3 is served by a botocore Stubber on the cached client, Gemini and Slack by
+an in-process HTTP server. Each dataset size runs in a fresh interpreter so
+import time and peak RSS are per case.
+
+Usage: python bench_handler.py [--days 30 365 730] [--accounts 3] [--services 7]
+                               [--ai-latency-ms 0] [--slack-429-every 0] [--tracemalloc]
+                               [--output results.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Answers Gemini generateContent/streamGenerateContent and Slack webhook posts"""
+
+    ai_latency = 0.0
+    # Answer every Nth Slack post with 429 Retry-After: 0 to exercise delivery retries
+    slack_429_every = 0
+    slack_posts = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status = 200
+        if self.path.startswith("/v1beta/"):
+            time.sleep(self.ai_latency)
+            body = json.dumps({"candidates": [{"content": {"parts": [{"text": "**💰 Cost Overview**\nBenchmark summary"}]}}]})
+            if ":streamGenerateContent" in self.path:
+                body = f"data: {body}\r\n\r\n"
+        else:
+            with self.lock:
+                _StandInHandler.slack_posts += 1
+                limited = self.slack_429_every and self.slack_posts % self.slack_429_every == 0
+            body = "rate_limited" if limited else "ok"
+            status = 429 if limited else 200
+        data = body.encode("utf-8")
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stand_in(ai_latency, slack_429_every=0):
+    _StandInHandler.ai_latency = ai_latency
+    _StandInHandler.slack_429_every = slack_429_every
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class _TimedBody:
+    """StreamingBody wrapper that charges read() time to the s3_read stage"""
+
+    def __init__(self, body, stages):
+        self.body = body
+        self.stages = stages
+
+    def read(self, amt=None):
+        start = time.perf_counter()
+        try:
+            return self.body.read(amt)
+        finally:
+            self.stages["s3_read"] = self.stages.get("s3_read", 0.0) + time.perf_counter() - start
+
+    def close(self):
+        self.body.close()
+
+
+def _timed(stages, name, func):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+    return wrapper
+
+
+def run_case(case):
+    """Runs inside the child interpreter; returns the measurements for one size"""
+    from botocore.response import StreamingBody
+    from botocore.stub import Stubber
+    from generate_mock_costs import make_accounts, make_services, write_dataset
+
+    buffer = io.BytesIO()
+    write_dataset(buffer, case["days"], services=make_services(case["services"]),
+                  accounts=make_accounts(case["accounts"]), seed=case["seed"])
+    payload = buffer.getvalue()
+    del buffer
+
+    start = time.perf_counter()
+    import handler
+    import_seconds = time.perf_counter() - start
+
+    import clients
+    import cost_state
+    s3 = clients.get_client("s3")
+    stubber = Stubber(s3)
+    stubber.add_client_error("get_object", service_error_code="NoSuchKey", http_status_code=404)
+    stubber.add_response("get_object", {
+        "Body": StreamingBody(io.BytesIO(payload), len(payload)),
+        "ETag": '"bench"',
+        "ContentLength": len(payload)
+    })
+    stubber.add_response("put_object", {})
+    stubber.activate()
+
+    stages = {}
+    original_get = s3.get_object
+
+    def timed_get(**kwargs):
+        response = original_get(**kwargs)
+        response["Body"] = _TimedBody(response["Body"], stages)
+        return response
+
+    s3.get_object = timed_get
+    cost_state.read_cost_series = _timed(stages, "read_parse", cost_state.read_cost_series)
+    handler.read_cost_series = cost_state.read_cost_series
+    handler.analyze_costs = _timed(stages, "analyze", handler.analyze_costs)
+    handler.detect_anomalies = _timed(stages, "anomaly", handler.detect_anomalies)
+    handler.generate_ai_summary = _timed(stages, "ai_summary", handler.generate_ai_summary)
+    handler.send_enhanced_slack_message = _timed(stages, "slack", handler.send_enhanced_slack_message)
+    handler.slack_delivery.flush = _timed(stages, "slack_flush", handler.slack_delivery.flush)
+
+    if case["tracemalloc"]:
+        import tracemalloc
+        tracemalloc.start()
+
+    log = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        result = handler.lambda_handler({"report_interval_minutes": 5}, None)
+    total_seconds = time.perf_counter() - start
+
+    allocations = None
+    if case["tracemalloc"]:
+        current, peak = tracemalloc.get_traced_memory()
+        allocations = {"traced_peak_bytes": peak, "traced_current_bytes": current}
+        tracemalloc.stop()
+
+    stages["parse"] = stages.pop("read_parse", 0.0) - stages.get("s3_read", 0.0)
+    return {
+        "days": case["days"],
+        "accounts": case["accounts"],
+        "services": case["services"],
+        "object_bytes": len(payload),
+        "status": result.get("status"),
+        "slack": result.get("slack"),
+        "import_ms": round(import_seconds * 1000, 2),
+        "invocation_ms": round(total_seconds * 1000, 2),
+        "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in stages.items()},
+        "handler_timings": result.get("timings"),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "allocations": allocations
+    }
+
+
+def run_in_child(case, env):
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--case", json.dumps(case)],
+        cwd=HERE, env=env, capture_output=True, text=True, check=False
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Benchmark case {case} failed:\n{process.stderr}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 365, 730])
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument("--services", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ai-latency-ms", type=float, default=0.0)
+    parser.add_argument("--slack-429-every", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="also record traced allocation peaks")
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    server, base_url = start_stand_in(args.ai_latency_ms / 1000.0, args.slack_429_every)
+    results = []
+    try:
+        for days in args.days:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                env = dict(os.environ)
+                env.update({
+                    "COST_REPORT_BUCKET": "bench-bucket",
+                    "COST_REPORT_KEY": "reports/bench.json",
+                    "AWS_REGION": "eu-north-1",
+                    "AWS_ACCESS_KEY_ID": "bench",
+                    "AWS_SECRET_ACCESS_KEY": "bench",
+                    "GOOGLE_API_KEY": "bench",
+                    "GEMINI_API_BASE": base_url,
+                    "SLACK_WEBHOOK_URL": f"{base_url}/slack",
+                    "REPORT_CACHE_DIR": os.path.join(cache_dir, "reports"),
+                    "SUMMARY_CACHE_DIR": os.path.join(cache_dir, "summaries"),
+                    "COST_REPORT_METRICS": "true"
+                })
+                case = {
+                    "days": days,
+                    "accounts": args.accounts,
+                    "services": args.services,
+                    "seed": args.seed,
+                    "tracemalloc": args.tracemalloc
+                }
+                results.append(run_in_child(case, env))
+                print(f"✅ {days} days: {results[-1]['invocation_ms']} ms", file=sys.stderr)
+    finally:
+        server.shutdown()
+
+    report = {"python": sys.version.split()[0], "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# ce_cache.py
+import datetime
+import hashlib
+import json
+import os
+import threading
+
+# /tmp survives between warm invocations; set to an empty string to disable the disk copy
+CE_CACHE_DIR = os.environ.get("CE_CACHE_DIR", "/tmp/ce-cache")
+# Optional S3 copy shared by every container and schedule
+CE_CACHE_BUCKET = os.environ.get("CE_CACHE_BUCKET", "")
+CE_CACHE_PREFIX = os.environ.get("CE_CACHE_PREFIX", "ce-cache/")
+# Days counted back from today (UTC) that are still open and always refetched;
+# the default covers yesterday too, which Cost Explorer is still restating
+CE_CACHE_OPEN_DAYS = int(os.environ.get("CE_CACHE_OPEN_DAYS", "2"))
+# Stored days per request shape before the oldest are dropped
+CE_CACHE_MAX_DAYS = int(os.environ.get("CE_CACHE_MAX_DAYS", "800"))
+
+
+def request_fingerprint(granularity, metrics, group_by, filter_=None):
+    """Hash of everything in a GetCostAndUsage request except its TimePeriod
+
+    Metrics are order-insensitive; GroupBy order is kept since it fixes the
+    order of each group's Keys.
+    """
+    shape = {
+        "granularity": granularity.upper(),
+        "metrics": sorted(metrics),
+        "group_by": [[group.get("Type"), group.get("Key")] for group in group_by],
+        "filter": filter_ or None
+    }
+    return hashlib.sha256(json.dumps(shape, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def day_range(start, end):
+    """Dates in [start, end)"""
+    return [start + datetime.timedelta(days=i) for i in range((end - start).days)]
+
+
+def missing_ranges(days, start, end):
+    """Contiguous [start, end) date ranges not covered by `days`"""
+    ranges = []
+    for day in day_range(start, end):
+        if day.isoformat() in days:
+            continue
+        if ranges and ranges[-1][1] == day:
+            ranges[-1][1] = day + datetime.timedelta(days=1)
+        else:
+            ranges.append([day, day + datetime.timedelta(days=1)])
+    return [tuple(r) for r in ranges]
+
+
+class CostExplorerCache:
+    """Per-day store of Cost Explorer results, keyed by request fingerprint
+
+    Days that are closed (older than CE_CACHE_OPEN_DAYS) never change, so
+    they are kept for good and only the open days are fetched again. Each
+    fingerprint lives in memory, mirrored to /tmp and optionally to S3.
+    """
+
+    def __init__(self, directory=CE_CACHE_DIR, bucket=CE_CACHE_BUCKET, prefix=CE_CACHE_PREFIX):
+        self.directory = directory
+        self.bucket = bucket
+        self.prefix = prefix
+        self._entries = {}  # fingerprint -> {"GroupDefinitions": [...], "days": {date: [results]}}
+        self._lock = threading.Lock()
+        self._request_locks = {}
+
+    def request_lock(self, fingerprint):
+        """Held from lookup to store so concurrent same-shape requests share one fetch"""
+        with self._lock:
+            return self._request_locks.setdefault(fingerprint, threading.Lock())
+
+    def _path(self, fingerprint):
+        return os.path.join(self.directory, f"{fingerprint}.json")
+
+    def _s3_key(self, fingerprint):
+        return f"{self.prefix}{fingerprint}.json"
+
+    def _load(self, fingerprint, s3=None):
+        entry = self._entries.get(fingerprint)
+        if entry is not None:
+            return entry
+        if self.directory:
+            try:
+                with open(self._path(fingerprint), "r") as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable Cost Explorer cache: {e}")
+        if entry is None and s3 is not None and self.bucket:
+            try:
+                response = s3.get_object(Bucket=self.bucket, Key=self._s3_key(fingerprint))
+                entry = json.loads(response["Body"].read())
+            except s3.exceptions.NoSuchKey:
+                pass
+            except Exception as e:
+                print(f"⚠️ Could not read Cost Explorer cache from S3: {e}")
+        entry = entry or {"GroupDefinitions": [], "days": {}}
+        self._entries[fingerprint] = entry
+        return entry
+
+    def lookup(self, fingerprint, start, end, s3=None):
+        """(cached results by day, GroupDefinitions, missing date ranges) for [start, end)"""
+        with self._lock:
+            entry = self._load(fingerprint, s3)
+            days = {day.isoformat(): entry["days"][day.isoformat()]
+                    for day in day_range(start, end) if day.isoformat() in entry["days"]}
+            return days, entry["GroupDefinitions"], missing_ranges(days, start, end)
+
+    def store(self, fingerprint, results, definitions, today=None, s3=None):
+        """Keep the closed days of freshly fetched results and persist them"""
+        today = today or datetime.datetime.now(datetime.timezone.utc).date()
+        open_from = (today - datetime.timedelta(days=CE_CACHE_OPEN_DAYS - 1)).isoformat()
+        closed = {}
+        for result in results:
+            day = result["TimePeriod"]["Start"][:10]
+            if day < open_from:
+                closed.setdefault(day, []).append(result)
+        if not closed:
+            return 0
+
+        with self._lock:
+            entry = self._load(fingerprint, s3)
+            entry["GroupDefinitions"] = definitions or entry["GroupDefinitions"]
+            entry["days"].update(closed)
+            if len(entry["days"]) > CE_CACHE_MAX_DAYS:
+                entry["days"] = dict(sorted(entry["days"].items())[-CE_CACHE_MAX_DAYS:])
+            body = json.dumps(entry, separators=(",", ":"))
+        self._persist(fingerprint, body, s3)
+        return len(closed)
+
+    def _persist(self, fingerprint, body, s3):
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = f"{self._path(fingerprint)}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(body)
+                os.replace(tmp_path, self._path(fingerprint))
+            except OSError as e:
+                print(f"⚠️ Could not write Cost Explorer cache: {e}")
+        if s3 is not None and self.bucket:
+            try:
+                s3.put_object(Bucket=self.bucket, Key=self._s3_key(fingerprint), Body=body.encode("utf-8"),
+                              ContentType="application/json")
+            except Exception as e:
+                print(f"⚠️ Could not write Cost Explorer cache to S3: {e}")
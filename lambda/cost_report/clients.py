@@ -0,0 +1,90 @@
+# clients.py
+import os
+import threading
+import time
+
+import boto3
+import requests
+from botocore.config import Config
+from botocore.exceptions import ConnectionError as BotoConnectionError, HTTPClientError
+from requests.adapters import HTTPAdapter
+
+# Warm containers keep these between invocations; rebuild them after this long
+CLIENT_MAX_AGE_SECONDS = int(os.environ.get("CLIENT_MAX_AGE_SECONDS", "3600"))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "10"))
+
+_lock = threading.Lock()
+_aws_clients = {}  # (service, region) -> (client, created_at)
+_http_session = None
+_http_session_created = 0.0
+
+_AWS_CONNECTION_ERRORS = (BotoConnectionError, HTTPClientError)
+
+
+def _fresh(created_at):
+    return time.time() - created_at < CLIENT_MAX_AGE_SECONDS
+
+
+def get_client(service, region=None):
+    """Return a cached boto3 client, creating it on first use in this container"""
+    region = region or os.environ.get("AWS_REGION", "eu-north-1")
+    cache_key = (service, region)
+    with _lock:
+        entry = _aws_clients.get(cache_key)
+        if entry is None or not _fresh(entry[1]):
+            config = Config(max_pool_connections=HTTP_POOL_SIZE, retries={"mode": "standard"})
+            client = boto3.client(service, region_name=region, config=config)
+            entry = (client, time.time())
+            _aws_clients[cache_key] = entry
+            print(f"🔌 Created {service} client for {region}")
+        return entry[0]
+
+
+def reset_client(service, region=None):
+    region = region or os.environ.get("AWS_REGION", "eu-north-1")
+    with _lock:
+        _aws_clients.pop((service, region), None)
+
+
+def call_with_client(service, func, region=None):
+    """Run func(client); rebuild the client once if its connection has gone bad"""
+    try:
+        return func(get_client(service, region))
+    except _AWS_CONNECTION_ERRORS as e:
+        print(f"♻️ {service} connection failed ({e}), rebuilding client")
+        reset_client(service, region)
+        return func(get_client(service, region))
+
+
+def get_http_session():
+    """Return the shared keep-alive session used for Gemini and Slack calls"""
+    global _http_session, _http_session_created
+    with _lock:
+        if _http_session is None or not _fresh(_http_session_created):
+            if _http_session is not None:
+                _http_session.close()
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+            _http_session_created = time.time()
+        return _http_session
+
+
+def reset_http_session():
+    global _http_session
+    with _lock:
+        if _http_session is not None:
+            _http_session.close()
+        _http_session = None
+
+
+def http_post(url, **kwargs):
+    """POST through the shared session, reconnecting once if a pooled connection went stale"""
+    try:
+        return get_http_session().post(url, **kwargs)
+    except requests.exceptions.ConnectionError as e:
+        print(f"♻️ HTTP connection failed ({e}), rebuilding session")
+        reset_http_session()
+        return get_http_session().post(url, **kwargs)
@@ -0,0 +1,113 @@
+# cost_analytics.py
+import os
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is not part of the default deployment package
+    np = None
+
+# Periods in the rolling average and the trailing window the statistics cover
+ROLLING_WINDOW = 7
+ANALYSIS_WINDOW = int(os.environ.get("ANALYSIS_WINDOW_PERIODS", "365"))
+PERCENTILES = (50, 90)
+PROJECTION_PERIODS = 30
+
+
+class PythonAnalytics:
+    """Pure-Python statistics over a sequence of period costs"""
+
+    name = "python"
+
+    def rolling_mean(self, values, window):
+        out = []
+        running = 0.0
+        for i, value in enumerate(values):
+            running += value
+            if i >= window:
+                running -= values[i - window]
+            out.append(running / min(i + 1, window))
+        return out
+
+    def trend_line(self, values):
+        """Least-squares slope and intercept against the period index"""
+        n = len(values)
+        if n < 2:
+            return 0.0, (values[0] if n else 0.0)
+        x_mean = (n - 1) / 2.0
+        y_mean = sum(values) / n
+        sxy = 0.0
+        for i, value in enumerate(values):
+            sxy += (i - x_mean) * (value - y_mean)
+        sxx = n * (n * n - 1) / 12.0
+        slope = sxy / sxx
+        return slope, y_mean - slope * x_mean
+
+    def percentiles(self, values, qs):
+        ordered = sorted(values)
+        n = len(ordered)
+        out = []
+        for q in qs:
+            rank = (n - 1) * q / 100.0
+            low = int(rank)
+            high = min(low + 1, n - 1)
+            out.append(ordered[low] + (ordered[high] - ordered[low]) * (rank - low))
+        return out
+
+
+class NumpyAnalytics:
+    """Vectorized statistics backed by NumPy arrays"""
+
+    name = "numpy"
+
+    def rolling_mean(self, values, window):
+        arr = np.asarray(values, dtype=np.float64)
+        csum = np.cumsum(arr)
+        csum[window:] = csum[window:] - csum[:-window]
+        counts = np.minimum(np.arange(1, len(arr) + 1), window)
+        return (csum / counts).tolist()
+
+    def trend_line(self, values):
+        arr = np.asarray(values, dtype=np.float64)
+        n = len(arr)
+        if n < 2:
+            return 0.0, (float(arr[0]) if n else 0.0)
+        x = np.arange(n, dtype=np.float64) - (n - 1) / 2.0
+        y_mean = arr.mean()
+        slope = float(np.dot(x, arr - y_mean) / (n * (n * n - 1) / 12.0))
+        return slope, float(y_mean - slope * (n - 1) / 2.0)
+
+    def percentiles(self, values, qs):
+        return np.percentile(np.asarray(values, dtype=np.float64), qs).tolist()
+
+
+def get_analytics_backend(name=None):
+    """Pick the analytics backend: numpy, python or auto (numpy when installed)"""
+    name = (name or os.environ.get("ANALYTICS_BACKEND", "auto")).lower()
+    if name == "python" or np is None:
+        if name == "numpy":
+            print("⚠️ NumPy not available, using pure-Python analytics")
+        return PythonAnalytics()
+    return NumpyAnalytics()
+
+
+def summarize(values, backend=None):
+    """Rolling average, trend line, percentiles and trend projection for a cost series"""
+    backend = backend or get_analytics_backend()
+    if not len(values):
+        return {}
+
+    slope, intercept = backend.trend_line(values)
+    n = len(values)
+    # Sum of the fitted line over the next PROJECTION_PERIODS periods
+    future_mid = n + (PROJECTION_PERIODS - 1) / 2.0
+    projected = max(0.0, (intercept + slope * future_mid) * PROJECTION_PERIODS)
+
+    stats = {
+        "rolling_avg": backend.rolling_mean(values, ROLLING_WINDOW)[-1],
+        "trend_slope": slope,
+        "projected_trend": projected,
+        "backend": backend.name,
+    }
+    for q, value in zip(PERCENTILES, backend.percentiles(values, PERCENTILES)):
+        stats[f"p{q}"] = value
+    return stats
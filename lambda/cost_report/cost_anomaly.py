@@ -0,0 +1,209 @@
+# cost_anomaly.py
+import datetime
+import math
+import os
+
+# "ewma" keeps seasonal baselines per service/account; "threshold" is the plain 1.3x-the-mean check
+ANOMALY_DETECTOR = os.environ.get("ANOMALY_DETECTOR", "ewma").lower()
+# Smoothing for the level/variance and for the weekday (or hour-of-day) factors
+ANOMALY_ALPHA = float(os.environ.get("ANOMALY_ALPHA", "0.1"))
+ANOMALY_SEASON_GAMMA = float(os.environ.get("ANOMALY_SEASON_GAMMA", "0.1"))
+# A point is anomalous when it is this many deviations from the baseline...
+ANOMALY_Z = float(os.environ.get("ANOMALY_Z", "3.5"))
+# ...and moved at least this fraction (the old 30% spike threshold)
+ANOMALY_MIN_CHANGE = float(os.environ.get("ANOMALY_MIN_CHANGE", "0.3"))
+# Groups whose cost and baseline are both below this are never reported
+ANOMALY_MIN_COST = float(os.environ.get("ANOMALY_MIN_COST", "1.0"))
+# Periods a baseline needs before it is trusted
+ANOMALY_WARMUP_PERIODS = int(os.environ.get("ANOMALY_WARMUP_PERIODS", "14"))
+# CUSUM slack and decision threshold (in deviations) for level shifts
+SHIFT_SLACK = 0.5
+SHIFT_THRESHOLD = float(os.environ.get("ANOMALY_SHIFT_THRESHOLD", "6"))
+MAX_GROUP_ALERTS = 5
+
+
+class Baseline:
+    """Seasonal EWMA baseline for one series, updated in O(1) per point"""
+
+    __slots__ = ("n", "level", "var", "season", "pos", "neg", "last")
+
+    def __init__(self, season_length):
+        self.n = 0
+        self.level = 0.0
+        self.var = 0.0
+        self.season = [1.0] * season_length
+        self.pos = 0.0  # CUSUM of upward deviations
+        self.neg = 0.0  # CUSUM of downward deviations
+        self.last = None  # [start, value, expected, z, kind] of the latest point
+
+    def update(self, start, slot, value):
+        """Score `value` against the baseline, then fold it in"""
+        factor = self.season[slot]
+        if self.n == 0:
+            self.level = value
+            self.n = 1
+            self.last = [start, value, value, 0.0, None]
+            return None
+
+        expected = self.level * factor
+        deviation = max(math.sqrt(self.var), 0.05 * abs(expected), 0.01)
+        z = (value - expected) / deviation
+        clipped = max(-4.0, min(4.0, z))
+        self.pos = max(0.0, self.pos + clipped - SHIFT_SLACK)
+        self.neg = max(0.0, self.neg - clipped - SHIFT_SLACK)
+
+        kind = None
+        if self.n >= ANOMALY_WARMUP_PERIODS:
+            change = (value - expected) / expected if expected else math.inf
+            if self.pos > SHIFT_THRESHOLD or self.neg > SHIFT_THRESHOLD:
+                kind = "level_shift"
+            elif z >= ANOMALY_Z and change >= ANOMALY_MIN_CHANGE:
+                kind = "spike"
+            elif z <= -ANOMALY_Z and change <= -ANOMALY_MIN_CHANGE:
+                kind = "drop"
+
+        alpha = ANOMALY_ALPHA
+        deseasonalized = value / factor if factor > 0 else value
+        if kind == "level_shift":
+            # Re-anchor on the new level instead of drifting towards it
+            self.level = deseasonalized
+            self.pos = self.neg = 0.0
+        else:
+            # Outliers are winsorised so one spike does not drag the baseline
+            bound = ANOMALY_Z * deviation / factor if factor > 0 else ANOMALY_Z * deviation
+            self.level += alpha * max(-bound, min(bound, deseasonalized - self.level))
+            residual = max(-ANOMALY_Z * deviation, min(ANOMALY_Z * deviation, value - expected))
+            self.var = alpha * residual * residual + (1 - alpha) * self.var
+
+        season = self.season
+        if self.level > 0 and value > 0:
+            season[slot] = ANOMALY_SEASON_GAMMA * min(value / self.level, 3.0) + (1 - ANOMALY_SEASON_GAMMA) * factor
+        if slot == 0:
+            # Once per cycle, rescale the factors to average 1 so they do not absorb the level
+            mean = sum(season) / len(season)
+            if mean > 0:
+                self.season = [f / mean for f in season]
+
+        self.n += 1
+        self.last = [start, value, expected, z, kind]
+        return kind
+
+    def to_state(self):
+        return [self.n, self.level, self.var, self.season, self.pos, self.neg, self.last]
+
+    @classmethod
+    def from_state(cls, state):
+        baseline = cls(len(state[3]))
+        baseline.n, baseline.level, baseline.var, season, baseline.pos, baseline.neg, baseline.last = state
+        baseline.season = list(season)
+        return baseline
+
+
+def season_slot(start):
+    """Weekday for daily periods, hour of day for hourly ones"""
+    if len(start) > 10:
+        return int(start[11:13]), 24
+    return datetime.date.fromisoformat(start).weekday(), 7
+
+
+def _change_pct(value, expected):
+    return round((value - expected) / expected * 100, 1) if expected else None
+
+
+class AnomalyDetector:
+    """Streaming anomaly engine over the total and every service/account series
+
+    Each new period updates the baselines it touches in constant time, and
+    the whole state round-trips through to_state() so the next invocation
+    only feeds in the periods it has not seen.
+    """
+
+    def __init__(self):
+        self.season_length = None
+        self.total = None
+        self.services = {}
+        self.accounts = {}
+        self.latest_start = None
+
+    def update(self, start, amount, services, accounts):
+        if not start:
+            return
+        slot, season_length = season_slot(start)
+        if self.season_length is None:
+            self.season_length = season_length
+            self.total = Baseline(season_length)
+        slot %= self.season_length
+
+        self.total.update(start, slot, amount)
+        for groups, baselines in ((services, self.services), (accounts, self.accounts)):
+            for name, value in groups.items():
+                baseline = baselines.get(name)
+                if baseline is None:
+                    baseline = baselines[name] = Baseline(self.season_length)
+                baseline.update(start, slot, value)
+        self.latest_start = start
+
+    def ready(self):
+        return self.total is not None and self.total.n > ANOMALY_WARMUP_PERIODS
+
+    def _group_alerts(self):
+        alerts = []
+        for dimension, baselines in (("service", self.services), ("account", self.accounts)):
+            for name, baseline in baselines.items():
+                start, value, expected, z, kind = baseline.last
+                if kind is None or start != self.latest_start or max(value, expected) < ANOMALY_MIN_COST:
+                    continue
+                alerts.append({
+                    "dimension": dimension,
+                    "name": name,
+                    "type": kind,
+                    "current": round(value, 2),
+                    "expected": round(expected, 2),
+                    "increase": _change_pct(value, expected),
+                    "z_score": round(z, 1)
+                })
+        alerts.sort(key=lambda alert: abs(alert["current"] - alert["expected"]), reverse=True)
+        return alerts[:MAX_GROUP_ALERTS]
+
+    def report(self):
+        """Anomalies at the latest period, in detect_anomalies' format, or None"""
+        if self.total is None:
+            return None
+        start, value, expected, z, kind = self.total.last
+        groups = self._group_alerts()
+        if kind is None and not groups:
+            return None
+        return {
+            "type": kind or "group_" + groups[0]["type"],
+            "period": start,
+            "current": round(value, 2),
+            "average": round(expected, 2),
+            "increase": _change_pct(value, expected),
+            "z_score": round(z, 1),
+            "groups": groups
+        }
+
+    def to_state(self):
+        return {
+            "season_length": self.season_length,
+            "latest_start": self.latest_start,
+            "total": self.total.to_state() if self.total else None,
+            "services": {name: baseline.to_state() for name, baseline in self.services.items()},
+            "accounts": {name: baseline.to_state() for name, baseline in self.accounts.items()}
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        detector = cls()
+        detector.season_length = state.get("season_length")
+        detector.latest_start = state.get("latest_start")
+        if state.get("total"):
+            detector.total = Baseline.from_state(state["total"])
+        detector.services = {name: Baseline.from_state(s) for name, s in state.get("services", {}).items()}
+        detector.accounts = {name: Baseline.from_state(s) for name, s in state.get("accounts", {}).items()}
+        return detector
+
+
+def new_detector():
+    """A fresh detector, or None when the threshold check is configured instead"""
+    return AnomalyDetector() if ANOMALY_DETECTOR == "ewma" else None
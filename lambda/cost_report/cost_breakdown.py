@@ -0,0 +1,44 @@
+# cost_breakdown.py
+import heapq
+import os
+
+BREAKDOWN_TOP_K = int(os.environ.get("BREAKDOWN_TOP_K", "5"))
+
+
+def _group(name, cost, grand_total):
+    return {"name": name, "cost": round(cost, 2), "share_pct": round(cost / grand_total * 100, 1) if grand_total else 0}
+
+
+def top_groups(totals, grand_total, k):
+    """Largest k groups with their share of spend, via a bounded heap"""
+    return [_group(name, cost, grand_total) for name, cost in heapq.nlargest(k, totals.items(), key=lambda item: item[1])]
+
+
+def _breakdown_of(totals, k):
+    grand_total = sum(totals.values())
+    top = heapq.nlargest(k, totals.items(), key=lambda item: item[1])
+    other = grand_total - sum(cost for _, cost in top)
+    return {
+        "top": [_group(name, cost, grand_total) for name, cost in top],
+        "count": len(totals),
+        "other_cost": round(other, 2),
+        "other_share_pct": round(other / grand_total * 100, 1) if grand_total else 0
+    }
+
+
+def breakdown(series, k=BREAKDOWN_TOP_K):
+    """Per-service and per-account top-K and share of spend from a CostSeries
+
+    The totals themselves are summed by CostSeries.add while the report is
+    read, from either Details rows or Cost Explorer Groups.
+    """
+    services = _breakdown_of(series.service_totals, k)
+    accounts = _breakdown_of(series.account_totals, k)
+    return {
+        "top_services": services["top"],
+        "top_accounts": accounts["top"],
+        "service_count": services["count"],
+        "account_count": accounts["count"],
+        "other_services_cost": services["other_cost"],
+        "other_services_share_pct": services["other_share_pct"]
+    }
@@ -0,0 +1,174 @@
+# cost_columns.py
+import datetime
+import json
+import struct
+import sys
+from array import array
+from collections.abc import MutableSequence
+
+from cost_anomaly import AnomalyDetector
+from cost_forecast import HoltWinters
+from cost_series import CostSeries
+
+MAGIC = b"CSC1"
+# magic, time unit, count, total, periods, head length, services, accounts, text length;
+# padded to 48 bytes so every column starts 8-byte aligned
+_HEADER = struct.Struct("<4sB3xqdIIIII4x")
+TIME_DAYS = 0
+TIME_HOURS = 1
+_EPOCH = datetime.datetime(1970, 1, 1)
+_HOUR_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _format_time(unit, number):
+    if unit == TIME_DAYS:
+        return datetime.date.fromordinal(number).isoformat()
+    return (_EPOCH + datetime.timedelta(hours=number)).strftime(_HOUR_FORMAT)
+
+
+def _parse_time(unit, value):
+    if unit == TIME_DAYS:
+        return datetime.date.fromisoformat(value).toordinal()
+    return int((datetime.datetime.strptime(value, _HOUR_FORMAT) - _EPOCH).total_seconds()) // 3600
+
+
+def _encode_times(values):
+    """Encode period boundaries as int32 day (or hour) numbers
+
+    Returns (unit, array) or None when the strings would not round-trip
+    exactly, e.g. timestamps with offsets or minutes.
+    """
+    unit = TIME_DAYS if all(isinstance(value, str) and len(value) == 10 for value in values) else TIME_HOURS
+    try:
+        numbers = array("i", (_parse_time(unit, value) for value in values))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if any(_format_time(unit, number) != value for number, value in zip(numbers, values)):
+        return None
+    return unit, numbers
+
+
+class PeriodColumn(MutableSequence):
+    """List of period boundary strings backed by an int32 array
+
+    Strings are only formatted when read, so loading a cached series does
+    not pay for the periods nobody looks at.
+    """
+
+    def __init__(self, unit, numbers):
+        self.unit = unit
+        self.numbers = numbers
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [_format_time(self.unit, number) for number in self.numbers[index]]
+        return _format_time(self.unit, self.numbers[index])
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self.numbers[index] = array("i", (_parse_time(self.unit, v) for v in value))
+        else:
+            self.numbers[index] = _parse_time(self.unit, value)
+
+    def __delitem__(self, index):
+        del self.numbers[index]
+
+    def insert(self, index, value):
+        self.numbers.insert(index, _parse_time(self.unit, value))
+
+
+def _padded(data):
+    return data + b"\0" * (-len(data) % 8)
+
+
+def _little_endian(column):
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def pack_series(series, fields=None):
+    """Serialise a CostSeries to the binary columnar format, or None if it cannot be
+
+    `fields` is a JSON-safe dict stored alongside (e.g. the cost_state
+    snapshot envelope); unpack_series gives it back.
+    """
+    series.trim()
+    times = _encode_times(list(series.starts) + list(series.ends))
+    if times is None:
+        return None
+    unit, numbers = times
+    periods = len(series.amounts)
+
+    services = list(series.service_totals)
+    accounts = list(series.account_totals)
+    # Strings (names, meta) go in one JSON block; every number is a fixed-width column
+    text = json.dumps({
+        "unit": series.unit,
+        "first_start": series.first_start,
+        "meta": series.meta,
+        "services": services,
+        "accounts": accounts,
+        "anomalies": series.anomalies.to_state() if series.anomalies is not None else None,
+        "forecaster": series.forecaster.to_state() if series.forecaster is not None else None,
+        "fields": fields or {}
+    }, separators=(",", ":")).encode("utf-8")
+
+    values = array("d", series.amounts)
+    values.extend(series.head)
+    values.extend(series.service_totals[name] for name in services)
+    values.extend(series.account_totals[name] for name in accounts)
+
+    header = _HEADER.pack(MAGIC, unit, series.count, series.total, periods, len(series.head),
+                          len(services), len(accounts), len(text))
+    return b"".join((header, _padded(text), _padded(_little_endian(numbers)), _little_endian(values)))
+
+
+def _column(buffer, typecode, offset, length):
+    column = array(typecode)
+    column.frombytes(buffer[offset:offset + length * column.itemsize])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def is_packed(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def unpack_series(buffer, max_periods=None):
+    """Rebuild (series, fields) from pack_series output"""
+    magic, unit, count, total, periods, head, n_services, n_accounts, text_length = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a cost columns file")
+    offset = _HEADER.size
+    text = json.loads(bytes(buffer[offset:offset + text_length]).decode("utf-8"))
+    offset += text_length + (-text_length % 8)
+
+    numbers = _column(buffer, "i", offset, 2 * periods)
+    offset += 2 * periods * numbers.itemsize
+    offset += -offset % 8
+    values = _column(buffer, "d", offset, periods + head + n_services + n_accounts)
+
+    series = CostSeries(text["meta"], max_periods)
+    series.count = count
+    series.total = total
+    series.first_start = text["first_start"]
+    series.unit = text["unit"]
+    series.starts = PeriodColumn(unit, numbers[:periods])
+    series.ends = PeriodColumn(unit, numbers[periods:])
+    series.amounts = values[:periods]
+    series.head = values[periods:periods + head]
+    totals = values[periods + head:].tolist()
+    series.service_totals = dict(zip(text["services"], totals[:n_services]))
+    series.account_totals = dict(zip(text["accounts"], totals[n_services:]))
+    if series.anomalies is not None and text.get("anomalies"):
+        series.anomalies = AnomalyDetector.from_state(text["anomalies"])
+    if series.forecaster is not None and text.get("forecaster"):
+        series.forecaster = HoltWinters.from_state(text["forecaster"])
+    series.trim()
+    return series, text.get("fields", {})
@@ -0,0 +1,248 @@
+# cost_forecast.py
+import datetime
+import math
+import os
+
+from cost_anomaly import season_slot
+
+try:
+    import numpy as np
+except ImportError:  # the parameter search falls back to a pure-Python loop
+    np = None
+
+# "holt_winters" forecasts with trend and weekday seasonality; "average" is mean-per-period scaling
+FORECAST_MODEL = os.environ.get("FORECAST_MODEL", "holt_winters").lower()
+# Trend damping keeps month-end projections from running away on a short-lived slope
+FORECAST_DAMPING = float(os.environ.get("FORECAST_DAMPING", "0.98"))
+# z for the confidence band (1.96 ~ 95%)
+FORECAST_BAND_Z = float(os.environ.get("FORECAST_BAND_Z", "1.96"))
+# Weight of each new one-step error in the running error variance
+FORECAST_ERROR_DECAY = 0.05
+# Smoothing parameters searched when fitting: (alpha, beta, gamma). NumPy steps
+# every combination at once, so it can afford the finer grid in the same time.
+PARAMETER_GRID = [
+    (alpha, beta, gamma)
+    for alpha in (0.1, 0.3, 0.5)
+    for beta in (0.01, 0.05, 0.15)
+    for gamma in (0.05, 0.15, 0.3)
+]
+FINE_PARAMETER_GRID = [
+    (alpha, beta, gamma)
+    for alpha in (0.05, 0.1, 0.2, 0.3, 0.45, 0.6)
+    for beta in (0.005, 0.02, 0.05, 0.15)
+    for gamma in (0.02, 0.05, 0.15, 0.3)
+]
+DEFAULT_PARAMETERS = (0.3, 0.05, 0.15)
+
+
+class HoltWinters:
+    """Additive damped-trend Holt-Winters state, updated in O(1) per observation"""
+
+    __slots__ = ("alpha", "beta", "gamma", "level", "trend", "season", "n", "mse", "last_slot", "fitted")
+
+    def __init__(self, parameters=DEFAULT_PARAMETERS, season_length=7):
+        self.alpha, self.beta, self.gamma = parameters
+        self.level = 0.0
+        self.trend = 0.0
+        self.season = [0.0] * season_length
+        self.n = 0
+        self.mse = 0.0
+        self.last_slot = None
+        self.fitted = False
+
+    def update(self, start, value):
+        if not start:
+            return
+        slot, season_length = season_slot(start)
+        if self.n == 0:
+            if season_length != len(self.season):
+                self.season = [0.0] * season_length
+            self.level = value
+        else:
+            slot %= len(self.season)
+            seasonal = self.season[slot]
+            predicted = self.level + FORECAST_DAMPING * self.trend + seasonal
+            error = value - predicted
+            self.mse = FORECAST_ERROR_DECAY * error * error + (1 - FORECAST_ERROR_DECAY) * self.mse if self.n > 1 else error * error
+            level = self.alpha * (value - seasonal) + (1 - self.alpha) * (self.level + FORECAST_DAMPING * self.trend)
+            self.trend = self.beta * (level - self.level) + (1 - self.beta) * FORECAST_DAMPING * self.trend
+            self.season[slot] = self.gamma * (value - level) + (1 - self.gamma) * seasonal
+            self.level = level
+        self.n += 1
+        self.last_slot = slot
+
+    def forecast(self, steps):
+        """Sum of the next `steps` period forecasts and the band half-width around it"""
+        if self.n == 0 or steps <= 0:
+            return 0.0, 0.0
+        total = 0.0
+        spread = 0.0
+        damped = 0.0
+        sigma = math.sqrt(self.mse)
+        m = len(self.season)
+        ab = 0.0
+        for h in range(1, steps + 1):
+            damped += FORECAST_DAMPING ** h
+            total += max(0.0, self.level + damped * self.trend + self.season[(self.last_slot + h) % m])
+            # h-step error grows with alpha/beta; summing the deviations bounds the band of the sum
+            spread += sigma * math.sqrt(1 + ab)
+            ab += (self.alpha * (1 + h * self.beta)) ** 2
+        return total, FORECAST_BAND_Z * spread
+
+    def to_state(self):
+        return [self.alpha, self.beta, self.gamma, self.level, self.trend, self.season,
+                self.n, self.mse, self.last_slot, self.fitted]
+
+    @classmethod
+    def from_state(cls, state):
+        model = cls(tuple(state[:3]), len(state[5]))
+        (_, _, _, model.level, model.trend, season, model.n, model.mse, model.last_slot, model.fitted) = state
+        model.season = list(season)
+        return model
+
+
+def _initial_state(values, slots, m):
+    """Level, trend and seasonal offsets from the first two seasons"""
+    first = values[:m]
+    second = values[m:2 * m]
+    level = sum(first) / m
+    trend = (sum(second) / m - level) / m
+    season = [0.0] * m
+    for value, slot in zip(first, slots[:m]):
+        season[slot] = value - level
+    return level, trend, season
+
+
+def _grid_sse_python(values, slots, init, grid):
+    level0, trend0, season0 = init
+    scores = []
+    for alpha, beta, gamma in grid:
+        level, trend, season = level0, trend0, list(season0)
+        sse = 0.0
+        for value, slot in zip(values, slots):
+            predicted = level + FORECAST_DAMPING * trend + season[slot]
+            error = value - predicted
+            sse += error * error
+            new_level = alpha * (value - season[slot]) + (1 - alpha) * (level + FORECAST_DAMPING * trend)
+            trend = beta * (new_level - level) + (1 - beta) * FORECAST_DAMPING * trend
+            season[slot] = gamma * (value - new_level) + (1 - gamma) * season[slot]
+            level = new_level
+        scores.append(sse)
+    return scores
+
+
+def _grid_sse_numpy(values, slots, init, grid):
+    """Run every parameter combination at once, one vector step per period"""
+    level0, trend0, season0 = init
+    params = np.asarray(grid, dtype=np.float64)
+    alpha, beta, gamma = params[:, 0], params[:, 1], params[:, 2]
+    size = len(grid)
+    level = np.full(size, level0)
+    trend = np.full(size, trend0)
+    season = np.tile(np.asarray(season0, dtype=np.float64), (size, 1))
+    sse = np.zeros(size)
+    for value, slot in zip(values, slots):
+        seasonal = season[:, slot]
+        error = value - (level + FORECAST_DAMPING * trend + seasonal)
+        sse += error * error
+        new_level = alpha * (value - seasonal) + (1 - alpha) * (level + FORECAST_DAMPING * trend)
+        trend = beta * (new_level - level) + (1 - beta) * FORECAST_DAMPING * trend
+        season[:, slot] = gamma * (value - new_level) + (1 - gamma) * seasonal
+        level = new_level
+    return sse.tolist()
+
+
+def fit_holt_winters(starts, values):
+    """Pick smoothing parameters by one-step error over the history and replay it
+
+    Returns a fitted HoltWinters, or None with fewer than two seasons of data.
+    """
+    starts = list(starts)
+    values = list(values)
+    if not starts or not starts[0]:
+        return None
+    m = season_slot(starts[0])[1]
+    if len(values) < 2 * m:
+        return None
+    slots = [season_slot(start)[0] % m for start in starts]
+
+    init = _initial_state(values, slots, m)
+    if np is not None:
+        grid = FINE_PARAMETER_GRID
+        scores = _grid_sse_numpy(values[m:], slots[m:], init, grid)
+    else:
+        grid = PARAMETER_GRID
+        scores = _grid_sse_python(values[m:], slots[m:], init, grid)
+
+    best_index = min(range(len(scores)), key=scores.__getitem__)
+    model = HoltWinters(grid[best_index], m)
+    model.level, model.trend, model.season = init[0], init[1], list(init[2])
+    model.mse = scores[best_index] / (len(values) - m)
+    model.n = m
+    model.last_slot = slots[m - 1]
+    for start, value in zip(starts[m:], values[m:]):
+        model.update(start, value)
+    model.fitted = True
+    return model
+
+
+def new_forecaster():
+    """A fresh incremental model, or None when FORECAST_MODEL=average"""
+    return HoltWinters() if FORECAST_MODEL == "holt_winters" else None
+
+
+def _month_to_date(series, month_start):
+    """Cost of the retained periods on or after month_start"""
+    total = 0.0
+    for i in range(len(series.amounts) - 1, -1, -1):
+        if series.starts[i][:10] < month_start:
+            break
+        total += series.amounts[i]
+    return total
+
+
+def project_costs(series, interval_minutes):
+    """Month-end and next-interval projections with confidence bands
+
+    Uses the series' Holt-Winters state (refitting it first if it was never
+    fitted); returns None when there is not enough history for the model.
+    """
+    model = series.forecaster
+    if model is None:
+        return None
+    if not model.fitted:
+        fitted = fit_holt_winters(series.starts, series.amounts)
+        if fitted is None:
+            return None
+        model = series.forecaster = fitted
+
+    last_end = series.last_end()
+    if not last_end:
+        return None
+    hourly = len(last_end) > 10
+    period_hours = 1 if hourly else 24
+    # The month still to come is the one containing the first uncovered period
+    current = datetime.date.fromisoformat(last_end[:10])
+    month_start = current.replace(day=1)
+    next_month = (month_start + datetime.timedelta(days=32)).replace(day=1)
+    remaining = (next_month - current).days * (24 if hourly else 1)
+    if hourly:
+        remaining -= int(last_end[11:13])
+
+    month_to_date = _month_to_date(series, month_start.isoformat())
+    rest, rest_band = model.forecast(remaining)
+
+    interval_hours = interval_minutes / 60.0
+    steps = max(1, math.ceil(interval_hours / period_hours))
+    scale = interval_hours / (steps * period_hours)
+    interval, interval_band = model.forecast(steps)
+
+    return {
+        "month_end": month_to_date + rest,
+        "month_end_low": max(month_to_date, month_to_date + rest - rest_band),
+        "month_end_high": month_to_date + rest + rest_band,
+        "month_to_date": month_to_date,
+        "interval": interval * scale,
+        "interval_low": max(0.0, (interval - interval_band) * scale),
+        "interval_high": (interval + interval_band) * scale
+    }
@@ -0,0 +1,214 @@
+# cost_ingest.py
+import datetime
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from ce_cache import CostExplorerCache, request_fingerprint
+from clients import call_with_client
+from cost_partitions import load_manifest, write_partitions
+
+# Cost Explorer is a global API served from us-east-1
+CE_REGION = os.environ.get("CE_REGION", "us-east-1")
+CE_GRANULARITY = os.environ.get("CE_GRANULARITY", "DAILY").upper()
+CE_GROUP_BY = [key.strip() for key in os.environ.get("CE_GROUP_BY", "SERVICE,LINKED_ACCOUNT").split(",") if key.strip()]
+CE_METRIC = os.environ.get("CE_METRIC", "BlendedCost")
+# First ingest into an empty store; hourly data only goes back 14 days
+CE_BACKFILL_DAYS = int(os.environ.get("CE_BACKFILL_DAYS", "90"))
+# Recent days re-fetched on every ingest, since Cost Explorer restates them
+CE_REFRESH_DAYS = int(os.environ.get("CE_REFRESH_DAYS", "2"))
+# Date-range chunk per request (hourly requests are capped at 14 days by the API)
+CE_SPLIT_DAYS = int(os.environ.get("CE_SPLIT_DAYS", "31"))
+CE_MAX_WORKERS = int(os.environ.get("CE_MAX_WORKERS", "4"))
+# Most a report invocation spends ingesting; the rest is left for reading and reporting
+CE_INGEST_MAX_SECONDS = float(os.environ.get("CE_INGEST_MAX_SECONDS", "120"))
+# Skip the API entirely when the store was refreshed this recently
+CE_INGEST_INTERVAL_MINUTES = float(os.environ.get("CE_INGEST_INTERVAL_MINUTES", "60"))
+
+# Reuse closed days across schedules and report targets (MONTHLY requests are never cached)
+CE_CACHE_ENABLED = os.environ.get("CE_CACHE_ENABLED", "true").lower() == "true"
+
+HOURLY_MAX_DAYS = 14
+
+# Shared by warm invocations
+ce_cache = CostExplorerCache()
+
+
+def _format_bound(day, granularity):
+    if granularity == "HOURLY":
+        return f"{day.isoformat()}T00:00:00Z"
+    return day.isoformat()
+
+
+def split_range(start, end, days):
+    """Split [start, end) into consecutive date ranges of at most `days` days"""
+    ranges = []
+    while start < end:
+        chunk_end = min(end, start + datetime.timedelta(days=days))
+        ranges.append((start, chunk_end))
+        start = chunk_end
+    return ranges
+
+
+def _group_by(keys):
+    return [{"Type": "DIMENSION", "Key": key} for key in keys]
+
+
+def _check_deadline(stop_at, what):
+    if stop_at is not None and time.monotonic() >= stop_at:
+        raise TimeoutError(f"Cost Explorer ingest ran out of time {what}")
+
+
+def fetch_range(ce, start, end, granularity=CE_GRANULARITY, group_by=CE_GROUP_BY, metric=CE_METRIC, filter_=None,
+                stop_at=None):
+    """All ResultsByTime for one range, following NextPageToken
+
+    botocore has no paginator for GetCostAndUsage, so pages are followed by
+    hand. A grouped period can continue on the next page; its Groups are
+    merged back into one entry. Raises TimeoutError instead of requesting
+    a page after `stop_at` (a time.monotonic() value).
+    """
+    request = {
+        "TimePeriod": {"Start": _format_bound(start, granularity), "End": _format_bound(end, granularity)},
+        "Granularity": granularity,
+        "Metrics": [metric],
+        "GroupBy": _group_by(group_by)
+    }
+    if filter_:
+        request["Filter"] = filter_
+    by_start = {}
+    definitions = []
+    token = None
+    while True:
+        _check_deadline(stop_at, f"paging {request['TimePeriod']['Start']}..{request['TimePeriod']['End']}")
+        response = ce.get_cost_and_usage(**request, **({"NextPageToken": token} if token else {}))
+        definitions = response.get("GroupDefinitions", definitions)
+        for result in response.get("ResultsByTime", []):
+            period_start = result["TimePeriod"]["Start"]
+            if period_start in by_start:
+                by_start[period_start].setdefault("Groups", []).extend(result.get("Groups", []))
+            else:
+                by_start[period_start] = result
+        token = response.get("NextPageToken")
+        if not token:
+            break
+    return [by_start[key] for key in sorted(by_start)], definitions
+
+
+def fetch_cost_and_usage(start, end, granularity=CE_GRANULARITY, group_by=CE_GROUP_BY, metric=CE_METRIC,
+                         filter_=None, region=None, stop_at=None):
+    """Fetch [start, end) as concurrent per-chunk requests; returns a Cost Explorer-shaped document
+
+    Closed days already in the request cache are not fetched again; only
+    the gaps (and the open recent days) go to the API. Past `stop_at` it
+    raises TimeoutError, after caching the chunks that did complete so a
+    later run picks up where this one stopped.
+    """
+    split_days = min(CE_SPLIT_DAYS, HOURLY_MAX_DAYS) if granularity == "HOURLY" else CE_SPLIT_DAYS
+    cacheable = CE_CACHE_ENABLED and granularity != "MONTHLY"
+    fingerprint = request_fingerprint(granularity, [metric], _group_by(group_by), filter_)
+
+    def fetch(bounds):
+        return call_with_client(
+            "ce", lambda ce: fetch_range(ce, bounds[0], bounds[1], granularity, group_by, metric, filter_, stop_at),
+            CE_REGION
+        )
+
+    with ce_cache.request_lock(fingerprint):
+        if cacheable:
+            cached, definitions, missing = call_with_client(
+                "s3", lambda s3: ce_cache.lookup(fingerprint, start, end, s3), region
+            )
+        else:
+            cached, definitions, missing = {}, [], [(start, end)]
+        ranges = [chunk for gap_start, gap_end in missing for chunk in split_range(gap_start, gap_end, split_days)]
+
+        fetched = []
+        pending = set()
+        if ranges:
+            pool = ThreadPoolExecutor(max_workers=min(CE_MAX_WORKERS, len(ranges)))
+            try:
+                futures = [pool.submit(fetch, bounds) for bounds in ranges]
+                timeout = None if stop_at is None else max(0.0, stop_at - time.monotonic())
+                # A request already in flight is abandoned at the deadline rather than waited for
+                _, pending = wait(futures, timeout=timeout)
+                for future in futures:
+                    if future in pending:
+                        continue
+                    try:
+                        chunk, chunk_definitions = future.result()
+                    except TimeoutError:
+                        pending.add(future)
+                        continue
+                    fetched.extend(chunk)
+                    definitions = chunk_definitions or definitions
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+        if cacheable and fetched:
+            call_with_client("s3", lambda s3: ce_cache.store(fingerprint, fetched, definitions, s3=s3), region)
+        if pending:
+            raise TimeoutError(f"Cost Explorer ingest ran out of time with {len(pending)} of {len(ranges)} "
+                               f"requests unfinished ({len(fetched)} periods cached for the next run)")
+
+    results = [result for day in cached.values() for result in day] + fetched
+    results.sort(key=lambda result: result["TimePeriod"]["Start"])
+    print(f"💸 Fetched {len(fetched)} {granularity.lower()} periods from Cost Explorer in {len(ranges)} requests"
+          f" ({len(cached)} days from cache)")
+    return {"GroupDefinitions": definitions, "ResultsByTime": results}
+
+
+def _ingest_start(manifest, today, granularity):
+    backfill = min(CE_BACKFILL_DAYS, HOURLY_MAX_DAYS) if granularity == "HOURLY" else CE_BACKFILL_DAYS
+    earliest = today - datetime.timedelta(days=backfill)
+    if not manifest or not manifest["partitions"]:
+        return earliest
+    last_end = list(manifest["partitions"].values())[-1]["end"]
+    start = datetime.date.fromisoformat(last_end[:10]) - datetime.timedelta(days=CE_REFRESH_DAYS)
+    return max(earliest, min(start, today))
+
+
+def _recently_ingested(manifest):
+    updated_at = (manifest or {}).get("meta", {}).get("ingested_at")
+    if not updated_at or CE_INGEST_INTERVAL_MINUTES <= 0:
+        return False
+    age = datetime.datetime.now(datetime.timezone.utc) - datetime.datetime.fromisoformat(updated_at)
+    return age.total_seconds() < CE_INGEST_INTERVAL_MINUTES * 60
+
+
+def ingest_cost_explorer(bucket, manifest_key, region=None, start=None, end=None,
+                         granularity=CE_GRANULARITY, force=False, time_limit=None):
+    """Pull recent Cost Explorer data into the partitioned store behind manifest_key
+
+    Without explicit bounds it backfills an empty store, then re-fetches only
+    the last CE_REFRESH_DAYS onwards. Returns a summary dict of what ran.
+    With `time_limit` seconds it raises TimeoutError once they are used up,
+    leaving the store as it was.
+    """
+    # DeadlineBudget gives inf without a Lambda context: no limit then
+    stop_at = None if time_limit is None or math.isinf(time_limit) else time.monotonic() + time_limit
+    manifest, _ = call_with_client("s3", lambda s3: load_manifest(s3, bucket, manifest_key), region)
+    if start is None and not force and _recently_ingested(manifest):
+        print("♻️ Cost Explorer data is fresh, skipping ingest")
+        return {"status": "skipped", "periods": 0}
+
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    start = start or _ingest_start(manifest, today, granularity)
+    # End is exclusive; include today's (estimated) partial period
+    end = end or today + datetime.timedelta(days=1)
+    document = fetch_cost_and_usage(start, end, granularity, region=region, stop_at=stop_at)
+    _check_deadline(stop_at, "before writing partitions")
+
+    meta = {
+        "GroupDefinitions": document["GroupDefinitions"],
+        "source": "cost_explorer",
+        "granularity": granularity,
+        "ingested_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+    }
+    # Hourly data is read a day at a time, so keep one partition per day
+    partition_granularity = "DAILY" if granularity == "HOURLY" else None
+    call_with_client("s3", lambda s3: write_partitions(
+        s3, bucket, manifest_key, document["ResultsByTime"], meta, partition_granularity
+    ), region)
+    return {"status": "success", "periods": len(document["ResultsByTime"]),
+            "start": start.isoformat(), "end": end.isoformat()}
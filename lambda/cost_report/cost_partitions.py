@@ -0,0 +1,279 @@
+# cost_partitions.py
+import argparse
+import datetime
+import json
+import os
+import posixpath
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cost_analytics import ANALYSIS_WINDOW
+from cost_series import CostSeries, build_cost_series
+from cost_state import (INCREMENTAL_STATE, STATE_REFRESH_HOURS, STATE_VERSION, encode_snapshot, load_snapshot,
+                        save_snapshot, state_key_for)
+from cost_stream import iter_results_by_time
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# One object per month (or per day) of ResultsByTime under the manifest's prefix
+PARTITION_GRANULARITY = os.environ.get("PARTITION_GRANULARITY", "MONTHLY").upper()
+PARTITION_ID_LENGTH = {"DAILY": 10, "MONTHLY": 7}
+# Trailing days read for trend/anomaly analysis; month-to-date is always read too
+PARTITION_WINDOW_DAYS = int(os.environ.get("PARTITION_WINDOW_DAYS", str(ANALYSIS_WINDOW)))
+PARTITION_FETCH_WORKERS = int(os.environ.get("PARTITION_FETCH_WORKERS", "8"))
+# Partitions ending this close to the newest data may still be restated by Cost Explorer:
+# they are decoded on every read and never folded into the saved series state
+PARTITION_OPEN_DAYS = int(os.environ.get("PARTITION_OPEN_DAYS", "3"))
+
+
+def is_manifest_key(key):
+    return posixpath.basename(key) == MANIFEST_NAME
+
+
+def partition_id(start, granularity=PARTITION_GRANULARITY):
+    """Partition a period belongs to: YYYY-MM for monthly, YYYY-MM-DD for daily"""
+    return start[:PARTITION_ID_LENGTH[granularity]]
+
+
+def partition_key(manifest_key, pid):
+    return posixpath.join(posixpath.dirname(manifest_key), f"{pid}.json")
+
+
+def load_manifest(s3, bucket, manifest_key):
+    """Fetch (manifest, response), or (None, None) if there is no manifest yet"""
+    try:
+        response = s3.get_object(Bucket=bucket, Key=manifest_key)
+    except s3.exceptions.NoSuchKey:
+        return None, None
+    manifest = json.loads(response["Body"].read())
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version {manifest.get('version')} in {manifest_key}")
+    return manifest, response
+
+
+def _put_json(s3, bucket, key, document):
+    return s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(document, separators=(",", ":")).encode("utf-8"),
+        ContentType="application/json"
+    )
+
+
+def _get_bytes(s3, bucket, key):
+    response = s3.get_object(Bucket=bucket, Key=key)
+    return response["Body"].read()
+
+
+def _write_partition(s3, bucket, manifest_key, manifest, pid, results):
+    """Write one partition, merging with periods already stored in it"""
+    entries = {r.get("TimePeriod", {}).get("Start"): r for r in results}
+    key = partition_key(manifest_key, pid)
+    existing = manifest["partitions"].get(pid)
+    ends = [r.get("TimePeriod", {}).get("End") or "" for r in results]
+    # Only a partition the new entries fully span can be replaced without reading it
+    if existing and (existing["start"] < min(entries) or existing["end"] > max(ends)):
+        stored = {r.get("TimePeriod", {}).get("Start"): r for r in json.loads(_get_bytes(s3, bucket, key))["ResultsByTime"]}
+        stored.update(entries)
+        entries = stored
+    ordered = [entries[start] for start in sorted(entries)]
+
+    response = _put_json(s3, bucket, key, {"ResultsByTime": ordered})
+    summary = build_cost_series(ordered, dict(manifest["meta"])).summary()
+    summary.update({"key": key, "etag": response.get("ETag")})
+    manifest["partitions"][pid] = summary
+    return summary
+
+
+def write_partitions(s3, bucket, manifest_key, results, meta=None, granularity=None):
+    """Split ResultsByTime entries into partition objects and update the manifest
+
+    Entries are written partition by partition as they arrive, so a long
+    history streams through with one partition in memory. Periods already
+    stored in a partition are kept unless the new entries replace them.
+    """
+    manifest, _ = load_manifest(s3, bucket, manifest_key)
+    if manifest is None:
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "granularity": (granularity or PARTITION_GRANULARITY).upper(),
+            "meta": {},
+            "partitions": {}
+        }
+    granularity = manifest["granularity"]
+    # GroupDefinitions tell the partition summaries which group key is which
+    manifest["meta"].update(meta or {})
+
+    pending, pending_id, written = [], None, 0
+    for result in results:
+        pid = partition_id(result.get("TimePeriod", {}).get("Start", ""), granularity)
+        if pending and pid != pending_id:
+            _write_partition(s3, bucket, manifest_key, manifest, pending_id, pending)
+            written += 1
+            pending = []
+        pending_id = pid
+        pending.append(result)
+    if pending:
+        _write_partition(s3, bucket, manifest_key, manifest, pending_id, pending)
+        written += 1
+
+    # meta may be filled in while a streamed source is being read
+    manifest["meta"].update(meta or {})
+    manifest["partitions"] = dict(sorted(manifest["partitions"].items()))
+    manifest["updated_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    # The manifest goes last so readers never see partitions it does not describe
+    _put_json(s3, bucket, manifest_key, manifest)
+    print(f"🗂️ Wrote {written} {granularity.lower()} partitions under {posixpath.dirname(manifest_key)}/")
+    return manifest
+
+
+def window_start(last_end, window_days=PARTITION_WINDOW_DAYS):
+    """Earliest date needed: the trailing window or the start of the month, whichever is older"""
+    end = datetime.date.fromisoformat(last_end[:10])
+    # End is exclusive, so the last covered day is the day before
+    last_day = end - datetime.timedelta(days=1)
+    return min(end - datetime.timedelta(days=window_days), last_day.replace(day=1)).isoformat()
+
+
+def _closed_count(partitions, open_days=PARTITION_OPEN_DAYS):
+    """How many leading partitions end at least open_days before the newest data"""
+    if not partitions:
+        return 0
+    newest = datetime.date.fromisoformat(partitions[-1][1]["end"][:10])
+    cutoff = (newest - datetime.timedelta(days=open_days)).isoformat()
+    closed = 0
+    for _, summary in partitions:
+        if summary["end"][:10] > cutoff:
+            break
+        closed += 1
+    return closed
+
+
+def _usable_state(snapshot, manifest_key, partitions):
+    """True if the saved state was built from exactly the first partitions as they are now"""
+    if not snapshot or snapshot.get("key") != manifest_key:
+        return False
+    if (time.time() - snapshot.get("refreshed_at", 0)) / 3600.0 >= STATE_REFRESH_HOURS:
+        return False
+    done = snapshot.get("partitions", [])
+    return len(done) <= len(partitions) and all(
+        [pid, summary.get("etag")] == list(entry) for (pid, summary), entry in zip(partitions, done)
+    )
+
+
+def read_partitioned_series(s3, bucket, manifest_key, max_periods=ANALYSIS_WINDOW,
+                            window_days=PARTITION_WINDOW_DAYS, fetch_workers=PARTITION_FETCH_WORKERS):
+    """Load a CostSeries from a partitioned report, reading only what the saved state lacks
+
+    The series (with its anomaly and forecast state) is saved next to the
+    manifest as of the last closed partition. While those partitions keep
+    their ETags, only the later ones are decoded and folded in. Otherwise,
+    and at least every STATE_REFRESH_HOURS, it is rebuilt from the trailing
+    window, with older partitions folded in from their manifest summaries
+    so totals still cover the whole history. Returns (series, info) like
+    read_cost_series; read_seconds covers the manifest and partition downloads,
+    of which at most fetch_workers run at once.
+    """
+    started = time.perf_counter()
+    manifest, response = load_manifest(s3, bucket, manifest_key)
+    manifest_seconds = time.perf_counter() - started
+    if manifest is None:
+        raise FileNotFoundError(f"No partition manifest at {manifest_key}")
+    partitions = list(manifest["partitions"].items())
+    closed = _closed_count(partitions)
+
+    state_key = state_key_for(manifest_key)
+    started = time.perf_counter()
+    snapshot = load_snapshot(s3, bucket, state_key, max_periods) if INCREMENTAL_STATE else None
+    state_load_seconds = time.perf_counter() - started
+
+    if _usable_state(snapshot, manifest_key, partitions):
+        series = snapshot["series"]
+        series.meta = dict(manifest.get("meta", {}))
+        done = len(snapshot["partitions"])
+        refreshed_at = snapshot["refreshed_at"]
+        needed = {pid for pid, _ in partitions[done:]}
+    else:
+        series = CostSeries(dict(manifest.get("meta", {})), max_periods)
+        done = 0
+        refreshed_at = time.time()
+        cutoff = window_start(partitions[-1][1]["end"], window_days) if partitions else ""
+        needed = {pid for pid, summary in partitions if summary["end"] > cutoff}
+    rebuild = done == 0
+
+    # Partitions are small: download them in parallel, then decode in order
+    started = time.perf_counter()
+    bodies = {}
+    if needed:
+        fetch = [(pid, summary["key"]) for pid, summary in partitions if pid in needed]
+        with ThreadPoolExecutor(max_workers=max(1, min(fetch_workers, len(fetch)))) as pool:
+            bodies = dict(zip([pid for pid, _ in fetch], pool.map(lambda item: _get_bytes(s3, bucket, item[1]), fetch)))
+    read_seconds = manifest_seconds + time.perf_counter() - started
+
+    checkpoint = None
+    for index, (pid, summary) in enumerate(partitions[done:], start=done):
+        if pid in bodies:
+            for result in json.loads(bodies[pid])["ResultsByTime"]:
+                series.add(result)
+        else:
+            series.add_summary(summary)
+        if index + 1 == closed:
+            if rebuild:
+                # Rebuilds refit the forecast like full reads; incremental reads update it
+                series.refit_forecaster()
+            # Encoded now: the open partitions folded in next must not be in the saved state
+            checkpoint = encode_snapshot({
+                "version": STATE_VERSION,
+                "key": manifest_key,
+                "refreshed_at": refreshed_at,
+                "last_end": series.last_end(),
+                "partitions": [[p, s.get("etag")] for p, s in partitions[:closed]],
+                "series": series
+            })
+    if rebuild and not closed:
+        series.refit_forecaster()
+    series.trim()
+
+    started = time.perf_counter()
+    if INCREMENTAL_STATE and checkpoint is not None:
+        save_snapshot(s3, bucket, state_key, checkpoint)
+    state_save_seconds = time.perf_counter() - started
+
+    last_modified = response.get("LastModified")
+    info = {
+        "mode": "partitioned" if rebuild else "partitioned_incremental",
+        "bytes_read": sum(len(body) for body in bodies.values()),
+        "read_seconds": read_seconds,
+        "state_load_seconds": state_load_seconds,
+        "state_save_seconds": state_save_seconds,
+        "new_periods": sum(summary["periods"] for pid, summary in partitions if pid in bodies),
+        "partitions_read": len(bodies),
+        "partitions_total": len(partitions),
+        "etag": response.get("ETag"),
+        "last_modified": last_modified.isoformat() if last_modified else None
+    }
+    return series, info
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a single cost report into partitions plus a manifest")
+    parser.add_argument("--bucket", required=True)
+    parser.add_argument("--source", required=True, help="key of the single-object cost report")
+    parser.add_argument("--manifest", required=True, help="key of the manifest to create or update")
+    parser.add_argument("--granularity", choices=sorted(PARTITION_ID_LENGTH), default=PARTITION_GRANULARITY)
+    parser.add_argument("--region")
+    args = parser.parse_args()
+
+    import boto3
+    s3 = boto3.client("s3", region_name=args.region)
+    response = s3.get_object(Bucket=args.bucket, Key=args.source)
+    meta = {}
+    manifest = write_partitions(
+        s3, args.bucket, args.manifest,
+        iter_results_by_time(response["Body"], meta), meta, args.granularity
+    )
+    print(f"Manifest {args.manifest}: {len(manifest['partitions'])} partitions.")
+
+
+if __name__ == "__main__":
+    main()
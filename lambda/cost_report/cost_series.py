@@ -0,0 +1,250 @@
+# cost_series.py
+from array import array
+
+from cost_anomaly import AnomalyDetector, new_detector
+from cost_forecast import HoltWinters, fit_holt_winters, new_forecaster
+
+
+def _cost(metrics):
+    """BlendedCost (or UnblendedCost) from a Total/Metrics dict"""
+    return metrics.get("BlendedCost") or metrics.get("UnblendedCost") or {}
+
+
+def _amount(row):
+    """Read BlendedCost.Amount from a ResultsByTime entry or Details row"""
+    return float(_cost(row.get("Total", {})).get("Amount", 0))
+
+
+def group_key_positions(meta):
+    """Index of the service and account key in Groups[].Keys
+
+    Taken from the response's GroupDefinitions when present; otherwise the
+    first key is the service and the second, if any, the account.
+    """
+    definitions = meta.get("GroupDefinitions")
+    if not definitions:
+        return 0, 1
+    keys = [definition.get("Key") for definition in definitions]
+    service = keys.index("SERVICE") if "SERVICE" in keys else None
+    account = keys.index("LINKED_ACCOUNT") if "LINKED_ACCOUNT" in keys else None
+    return service, account
+
+
+def period_groups(result, meta):
+    """Per-service and per-account amounts of one ResultsByTime entry
+
+    Reads Details rows or Cost Explorer Groups. Returns (services, accounts,
+    sum of the groups).
+    """
+    services = {}
+    accounts = {}
+    group_sum = 0.0
+    details = result.get("Details")
+    if details:
+        for row in details:
+            row_amount = _amount(row)
+            service = row.get("Service", "Other")
+            account = row.get("Account", "unknown")
+            services[service] = services.get(service, 0.0) + row_amount
+            accounts[account] = accounts.get(account, 0.0) + row_amount
+
+    groups = result.get("Groups")
+    if groups:
+        service_at, account_at = group_key_positions(meta)
+        for group in groups:
+            keys = group.get("Keys", ())
+            row_amount = float(_cost(group.get("Metrics", {})).get("Amount", 0))
+            group_sum += row_amount
+            if service_at is not None and service_at < len(keys):
+                services[keys[service_at]] = services.get(keys[service_at], 0.0) + row_amount
+            if account_at is not None and account_at < len(keys):
+                accounts[keys[account_at]] = accounts.get(keys[account_at], 0.0) + row_amount
+    return services, accounts, group_sum
+
+
+class CostSeries:
+    """Columnar cost history built in one pass over ResultsByTime
+
+    Every metric in analyze_costs/detect_anomalies reads from these columns
+    and running totals instead of walking the raw entries again. With
+    `max_periods`, only the trailing periods are kept in the columns while
+    the totals still cover the whole history.
+    """
+
+    HEAD_SIZE = 3
+
+    def __init__(self, meta=None, max_periods=None):
+        self.meta = meta if meta is not None else {}
+        self.max_periods = max_periods
+        self.starts = []
+        self.ends = []
+        self.amounts = array("d")
+        self.head = array("d")
+        self.count = 0
+        self.total = 0.0
+        self.first_start = None
+        self.unit = "USD"
+        self.service_totals = {}
+        self.account_totals = {}
+        # Streaming per-service/account anomaly baselines (None with ANOMALY_DETECTOR=threshold)
+        self.anomalies = new_detector()
+        # Incremental Holt-Winters model (None with FORECAST_MODEL=average)
+        self.forecaster = new_forecaster()
+
+    def add(self, result):
+        """Fold one ResultsByTime entry into the series
+
+        Per-service and per-account totals come from Details rows or from
+        Cost Explorer Groups; grouped responses often leave Total empty, in
+        which case the period amount is the sum of its groups.
+        """
+        period = result.get("TimePeriod", {})
+        period_services, period_accounts, group_sum = period_groups(result, self.meta)
+        amount = _amount(result) if result.get("Total") or not result.get("Groups") else group_sum
+        if self.count == 0:
+            self.unit = _cost(result.get("Total", {})).get("Unit", self.unit)
+            self.first_start = period.get("Start")
+
+        self.starts.append(period.get("Start"))
+        self.ends.append(period.get("End"))
+        self.amounts.append(amount)
+        if len(self.head) < self.HEAD_SIZE:
+            self.head.append(amount)
+        self.count += 1
+        self.total += amount
+        # Trim in batches so dropping old periods stays amortised O(1)
+        if self.max_periods and len(self.amounts) >= 2 * self.max_periods:
+            self.trim()
+
+        services = self.service_totals
+        for name, value in period_services.items():
+            services[name] = services.get(name, 0.0) + value
+        accounts = self.account_totals
+        for name, value in period_accounts.items():
+            accounts[name] = accounts.get(name, 0.0) + value
+
+        if self.anomalies is not None:
+            self.anomalies.update(period.get("Start"), amount, period_services, period_accounts)
+        if self.forecaster is not None:
+            self.forecaster.update(period.get("Start"), amount)
+
+    def add_summary(self, summary):
+        """Fold pre-aggregated periods (see summary()) into the totals only
+
+        The periods are counted but not added to the columns, so summaries
+        must be folded in before any later entries are added.
+        """
+        if not summary.get("periods"):
+            return
+        if self.count == 0:
+            self.unit = summary.get("unit", self.unit)
+            self.first_start = summary.get("start")
+        for amount in summary.get("head", ())[:self.HEAD_SIZE - len(self.head)]:
+            self.head.append(amount)
+        self.count += summary["periods"]
+        self.total += summary["total"]
+        for name, amount in summary.get("service_totals", {}).items():
+            self.service_totals[name] = self.service_totals.get(name, 0.0) + amount
+        for name, amount in summary.get("account_totals", {}).items():
+            self.account_totals[name] = self.account_totals.get(name, 0.0) + amount
+
+    def summary(self):
+        """Running totals without the columns, for folding back in with add_summary"""
+        return {
+            "periods": self.count,
+            "total": self.total,
+            "start": self.first_start,
+            "end": self.last_end(),
+            "unit": self.unit,
+            "head": self.head.tolist(),
+            "service_totals": self.service_totals,
+            "account_totals": self.account_totals
+        }
+
+    def refit_forecaster(self):
+        """Re-pick the forecast parameters from the retained periods"""
+        if self.forecaster is not None:
+            self.forecaster = fit_holt_winters(self.starts, self.amounts) or self.forecaster
+
+    def trim(self):
+        """Drop columns older than the last `max_periods` periods"""
+        if not self.max_periods or len(self.amounts) <= self.max_periods:
+            return
+        drop = len(self.amounts) - self.max_periods
+        del self.starts[:drop]
+        del self.ends[:drop]
+        del self.amounts[:drop]
+
+    def last_end(self):
+        return self.ends[-1] if self.ends else None
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def head_mean(self, n):
+        values = self.head[:n]
+        return sum(values) / len(values) if values else 0.0
+
+    def tail_mean(self, n):
+        values = self.amounts[-n:]
+        return sum(values) / len(values) if values else 0.0
+
+    def latest(self):
+        return self.amounts[-1] if self.amounts else 0.0
+
+    def to_snapshot(self):
+        """Serialise running totals and the retained window to a JSON-safe dict"""
+        self.trim()
+        return {
+            "count": self.count,
+            "total": self.total,
+            "first_start": self.first_start,
+            "unit": self.unit,
+            "head": self.head.tolist(),
+            "starts": list(self.starts),
+            "ends": list(self.ends),
+            "amounts": self.amounts.tolist(),
+            "service_totals": self.service_totals,
+            "account_totals": self.account_totals,
+            "anomalies": self.anomalies.to_state() if self.anomalies is not None else None,
+            "forecaster": self.forecaster.to_state() if self.forecaster is not None else None
+        }
+
+    @classmethod
+    def from_snapshot(cls, data, meta=None, max_periods=None):
+        """Restore a series saved with to_snapshot"""
+        series = cls(meta, max_periods)
+        series.count = data["count"]
+        series.total = data["total"]
+        series.first_start = data.get("first_start")
+        series.unit = data.get("unit", series.unit)
+        series.head = array("d", data["head"])
+        series.starts = list(data["starts"])
+        series.ends = list(data["ends"])
+        series.amounts = array("d", data["amounts"])
+        series.service_totals = dict(data.get("service_totals", {}))
+        series.account_totals = dict(data.get("account_totals", {}))
+        if series.anomalies is not None and data.get("anomalies"):
+            series.anomalies = AnomalyDetector.from_state(data["anomalies"])
+        if series.forecaster is not None and data.get("forecaster"):
+            series.forecaster = HoltWinters.from_state(data["forecaster"])
+        series.trim()
+        return series
+
+
+def build_cost_series(results, meta=None):
+    """Aggregate an iterable of ResultsByTime entries into a CostSeries"""
+    series = CostSeries(meta)
+    for result in results:
+        series.add(result)
+    return series
+
+
+def as_cost_series(cost_data):
+    """Accept either a CostSeries or a raw cost document dict"""
+    if isinstance(cost_data, CostSeries):
+        return cost_data
+    if not isinstance(cost_data, dict):
+        return CostSeries()
+    meta = {k: v for k, v in cost_data.items() if k != "ResultsByTime"}
+    return build_cost_series(cost_data.get("ResultsByTime", ()), meta)
@@ -0,0 +1,214 @@
+# cost_state.py
+import hashlib
+import json
+import os
+import posixpath
+import time
+
+from botocore.exceptions import ClientError
+
+from cost_analytics import ANALYSIS_WINDOW
+from cost_columns import is_packed, pack_series, unpack_series
+from cost_series import CostSeries
+from cost_stream import CountingReader, EntryTracker, iter_results_by_time
+from report_cache import is_not_modified_error
+
+STATE_VERSION = 3
+INCREMENTAL_STATE = os.environ.get("INCREMENTAL_STATE", "true").lower() == "true"
+# Full recompute at least this often so restated past periods are picked up
+STATE_REFRESH_HOURS = float(os.environ.get("STATE_REFRESH_HOURS", "24"))
+
+
+def state_key_for(key):
+    """S3 key of the aggregate snapshot stored next to a cost report"""
+    root, _ = posixpath.splitext(key)
+    return f"{root}.state.cols"
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def encode_snapshot(snapshot):
+    """Snapshot as a cost_columns object: the series in columns, the other fields in its JSON block
+
+    Series whose period strings would not round-trip through the columns
+    format are stored as a JSON document instead.
+    """
+    series = snapshot["series"]
+    fields = {name: value for name, value in snapshot.items() if name not in ("series", "meta")}
+    data = pack_series(series, fields)
+    if data is None:
+        data = json.dumps(dict(fields, meta=series.meta, series=series.to_snapshot())).encode("utf-8")
+    return data
+
+
+def decode_snapshot(data, max_periods=None):
+    """Inverse of encode_snapshot; "series" comes back as a CostSeries"""
+    if is_packed(data):
+        series, snapshot = unpack_series(data, max_periods)
+    else:
+        snapshot = json.loads(data)
+        series = CostSeries.from_snapshot(snapshot["series"], dict(snapshot["meta"]), max_periods)
+    snapshot["series"] = series
+    snapshot["meta"] = series.meta
+    return snapshot
+
+
+def load_snapshot(s3, bucket, state_key, max_periods=None):
+    """Fetch a previously saved snapshot, or None if missing or unreadable"""
+    try:
+        response = s3.get_object(Bucket=bucket, Key=state_key)
+        snapshot = decode_snapshot(response["Body"].read(), max_periods)
+    except s3.exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        print(f"⚠️ Could not load cost state {state_key}: {e}")
+        return None
+
+    if snapshot.get("version") != STATE_VERSION:
+        return None
+    return snapshot
+
+
+def save_snapshot(s3, bucket, state_key, snapshot):
+    """Store a snapshot dict, or one already encoded with encode_snapshot"""
+    try:
+        s3.put_object(
+            Bucket=bucket,
+            Key=state_key,
+            Body=snapshot if isinstance(snapshot, bytes) else encode_snapshot(snapshot),
+            ContentType="application/octet-stream"
+        )
+        print(f"💾 Cost state saved to {state_key}")
+    except Exception as e:
+        print(f"⚠️ Could not save cost state {state_key}: {e}")
+
+
+def build_snapshot(key, response, series, tracker, refreshed_at, previous=None):
+    """Capture running totals plus where to resume reading the report object"""
+    last_modified = response.get("LastModified")
+    snapshot = {
+        "version": STATE_VERSION,
+        "key": key,
+        "etag": response.get("ETag"),
+        "last_modified": last_modified.isoformat() if last_modified else None,
+        "refreshed_at": refreshed_at,
+        "last_end": series.last_end(),
+        "meta": series.meta,
+        "series": series,
+        "resume_offset": None,
+        "tail_length": None,
+        "tail_sha256": None
+    }
+
+    if not tracker.ascii:
+        # Char offsets no longer match byte offsets, next run reads the whole object
+        return snapshot
+    if tracker.start is not None:
+        snapshot["resume_offset"] = tracker.start
+        snapshot["tail_length"] = tracker.end - tracker.start
+        snapshot["tail_sha256"] = _digest(tracker.raw.encode("utf-8"))
+    elif previous:
+        for field in ("resume_offset", "tail_length", "tail_sha256"):
+            snapshot[field] = previous.get(field)
+    return snapshot
+
+
+def _can_resume(snapshot, key):
+    if not snapshot or snapshot.get("key") != key or snapshot.get("resume_offset") is None:
+        return False
+    age_hours = (time.time() - snapshot.get("refreshed_at", 0)) / 3600.0
+    return age_hours < STATE_REFRESH_HOURS
+
+
+def _resume(s3, bucket, key, snapshot, max_periods):
+    """Range-read from the last processed entry and fold in only newer periods"""
+    offset = snapshot["resume_offset"]
+    length = snapshot["tail_length"]
+    series = snapshot["series"]
+    started = time.perf_counter()
+    try:
+        response = s3.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes={offset}-", IfNoneMatch=snapshot["etag"]
+        )
+    except ClientError as e:
+        if not is_not_modified_error(e):
+            raise
+        print("♻️ Cost report unchanged since last snapshot")
+        info = {"mode": "unchanged", "bytes_read": 0, "read_seconds": time.perf_counter() - started,
+                "new_periods": 0, "etag": snapshot["etag"], "last_modified": snapshot.get("last_modified")}
+        return series, snapshot, info
+    request_seconds = time.perf_counter() - started
+    reader = CountingReader(response["Body"])
+
+    # The object must still contain the exact entry we stopped at
+    tail = reader.read(length)
+    if _digest(tail) != snapshot["tail_sha256"]:
+        response["Body"].close()
+        print("⚠️ Cost report changed before the last processed period, recomputing")
+        return None
+
+    tracker = EntryTracker(offset + length)
+    last_end = snapshot.get("last_end")
+    new_periods = 0
+    for result in iter_results_by_time(reader, series.meta, tracker=tracker, resume=True):
+        end = result.get("TimePeriod", {}).get("End")
+        if last_end and end and end <= last_end:
+            continue
+        series.add(result)
+        new_periods += 1
+
+    new_snapshot = build_snapshot(key, response, series, tracker, snapshot["refreshed_at"], snapshot)
+    info = {"mode": "incremental", "bytes_read": reader.bytes_read, "read_seconds": request_seconds + reader.read_seconds,
+            "new_periods": new_periods, "etag": new_snapshot["etag"], "last_modified": new_snapshot["last_modified"]}
+    return series, new_snapshot, info
+
+
+def _full_read(s3, bucket, key, max_periods):
+    started = time.perf_counter()
+    response = s3.get_object(Bucket=bucket, Key=key)
+    request_seconds = time.perf_counter() - started
+    reader = CountingReader(response["Body"])
+    tracker = EntryTracker()
+    meta = {}
+    series = CostSeries(meta, max_periods)
+    for result in iter_results_by_time(reader, meta, tracker=tracker):
+        series.add(result)
+    # Full reads (at least every STATE_REFRESH_HOURS) refit the forecast; resumes update it
+    series.refit_forecaster()
+
+    snapshot = build_snapshot(key, response, series, tracker, time.time())
+    info = {"mode": "full", "bytes_read": reader.bytes_read, "read_seconds": request_seconds + reader.read_seconds,
+            "new_periods": series.count, "etag": snapshot["etag"], "last_modified": snapshot["last_modified"]}
+    return series, snapshot, info
+
+
+def read_cost_series(s3, bucket, key, max_periods=ANALYSIS_WINDOW):
+    """Load the CostSeries for a report, reusing the saved snapshot when possible
+
+    Returns (series, info) where info records the read mode, bytes fetched,
+    how many periods were folded in and the seconds spent on S3: the report
+    request and its body reads (read_seconds) and the snapshot load and save.
+    """
+    state_key = state_key_for(key)
+    started = time.perf_counter()
+    snapshot = load_snapshot(s3, bucket, state_key, max_periods) if INCREMENTAL_STATE else None
+    state_load_seconds = time.perf_counter() - started
+
+    result = None
+    if _can_resume(snapshot, key):
+        try:
+            result = _resume(s3, bucket, key, snapshot, max_periods)
+        except Exception as e:
+            print(f"⚠️ Incremental read failed, recomputing: {e}")
+    if result is None:
+        result = _full_read(s3, bucket, key, max_periods)
+
+    series, new_snapshot, info = result
+    started = time.perf_counter()
+    if INCREMENTAL_STATE and new_snapshot is not snapshot:
+        save_snapshot(s3, bucket, state_key, new_snapshot)
+    info["state_load_seconds"] = state_load_seconds
+    info["state_save_seconds"] = time.perf_counter() - started
+    return series, info
@@ -0,0 +1,182 @@
+# cost_stream.py
+import codecs
+import json
+import time
+
+# Bytes pulled from the S3 StreamingBody per read
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+# A number followed by one of these may continue in the next chunk ("1234." + "56")
+_NUMBER_CHARS = ".eE+-0123456789"
+
+
+class EntryTracker:
+    """Byte position and raw text of the most recent ResultsByTime entry
+
+    Offsets are only meaningful while `ascii` is true (one char == one byte).
+    """
+
+    def __init__(self, base_offset=0):
+        self.base_offset = base_offset
+        self.start = None
+        self.end = None
+        self.raw = None
+        self.ascii = True
+
+
+class CountingReader:
+    """Wrap a byte stream and count the bytes read through it and the time spent reading"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+        self.read_seconds = 0.0
+
+    def read(self, amt=None):
+        start = time.perf_counter()
+        data = self.stream.read(amt)
+        self.read_seconds += time.perf_counter() - start
+        self.bytes_read += len(data)
+        return data
+
+
+class _TextWindow:
+    """Sliding window of decoded text over a byte stream"""
+
+    def __init__(self, stream, chunk_size, base=0):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.base = base  # stream offset of text[0]
+        self.eof = False
+        self.ascii = True
+
+    def fill(self, size=None):
+        """Read one more chunk (`size` bytes, default chunk_size), dropping text that was already consumed"""
+        if self.eof:
+            return False
+        chunk = self.stream.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            tail = self.utf8.decode(b"", final=True)
+        else:
+            if self.ascii and not chunk.isascii():
+                self.ascii = False
+            tail = self.utf8.decode(chunk)
+        self.base += self.pos
+        self.text = self.text[self.pos:] + tail
+        self.pos = 0
+        return bool(chunk)
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            text = self.text
+            pos = self.pos
+            while pos < len(text) and text[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(text):
+                return text[pos]
+            if not self.fill():
+                return ""
+
+    def take(self, expected):
+        """Consume the next non-whitespace character and check it is one of `expected`"""
+        char = self.peek()
+        if not char or char not in expected:
+            raise ValueError(f"Expected one of {expected!r} in cost document, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value, reading more chunks as needed"""
+        self.peek()
+        # Every retry decodes the value from its start again, so the read size doubles while
+        # it is incomplete: an entry spanning many chunks costs O(n) to decode, not O(n^2)
+        size = self.chunk_size
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.fill(size):
+                    size *= 2
+                    continue
+                raise
+            # A value ending at the buffer edge, or a number cut mid-way, may continue in the next chunk
+            cut = end == len(self.text) or (isinstance(obj, (int, float)) and self.text[end] in _NUMBER_CHARS)
+            if cut and self.fill(size):
+                size *= 2
+                continue
+            self.pos = end
+            return obj
+
+
+def _iter_entries(window, tracker, opened):
+    """Yield ResultsByTime array elements
+
+    `opened` is true right after "[" and false when resuming after an element.
+    """
+    if opened:
+        if window.peek() == "]":
+            window.take("]")
+            return
+    elif window.take(",]") == "]":
+        return
+
+    while True:
+        window.peek()
+        start = window.base + window.pos
+        entry = window.value()
+        if tracker is not None:
+            tracker.start = start
+            tracker.end = window.base + window.pos
+            tracker.raw = window.text[start - window.base:window.pos]
+        yield entry
+        if window.take(",]") == "]":
+            return
+
+
+def iter_results_by_time(stream, meta=None, chunk_size=CHUNK_SIZE, tracker=None, resume=False):
+    """Yield ResultsByTime entries one at a time from a JSON cost document stream
+
+    Top-level keys other than ResultsByTime are decoded whole and stored in `meta`.
+    With `resume`, the stream must start right after a ResultsByTime element
+    and `tracker.base_offset` gives that position in the object (see cost_state).
+    """
+    if meta is None:
+        meta = {}
+    window = _TextWindow(stream, chunk_size, tracker.base_offset if tracker else 0)
+
+    try:
+        if resume:
+            yield from _iter_entries(window, tracker, opened=False)
+            if window.take(",}") == "}":
+                return
+        else:
+            window.take("{")
+            if window.peek() == "}":
+                window.take("}")
+                return
+
+        while True:
+            key = window.value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected an object key, got {key!r}")
+            window.take(":")
+
+            if key == "ResultsByTime" and window.peek() == "[":
+                window.take("[")
+                yield from _iter_entries(window, tracker, opened=True)
+            else:
+                meta[key] = window.value()
+
+            if window.take(",}") == "}":
+                break
+    finally:
+        if tracker is not None:
+            tracker.ascii = window.ascii
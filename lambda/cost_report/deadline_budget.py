@@ -0,0 +1,68 @@
+# deadline_budget.py
+import math
+import os
+import threading
+import time
+
+from slack_delivery import SLACK_RETRY_BUDGET_SECONDS
+
+# Never plan work into the last part of the invocation: returning takes time too
+DEADLINE_MARGIN_SECONDS = float(os.environ.get("DEADLINE_MARGIN_SECONDS", "3"))
+# Kept back for the deterministic Slack report whatever runs before it: one post through all its retries
+DELIVERY_RESERVE_SECONDS = float(os.environ.get("DELIVERY_RESERVE_SECONDS", SLACK_RETRY_BUDGET_SECONDS))
+# Optional stages are skipped outright when they would get less than this
+OPTIONAL_STAGE_MIN_SECONDS = {
+    "cost_explorer_ingest": float(os.environ.get("INGEST_MIN_SECONDS", "20")),
+    "generate_ai_summary": float(os.environ.get("AI_SUMMARY_MIN_SECONDS", "5")),
+    "render_sinks": 1.0
+}
+
+
+class DeadlineBudget:
+    """Splits the invocation's remaining time between pipeline stages
+
+    Reads the Lambda context's get_remaining_time_in_millis() once; without
+    a context (local runs, benchmarks) the budget is unlimited. Optional
+    stages ask allot() for their share and are recorded as skipped when
+    too little is left, so required stages always get their reserve.
+    """
+
+    def __init__(self, context=None, margin=DEADLINE_MARGIN_SECONDS):
+        remaining_ms = getattr(context, "get_remaining_time_in_millis", None)
+        self.deadline = time.monotonic() + remaining_ms() / 1000.0 - margin if remaining_ms else None
+        self.skipped = []
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """Seconds left before the planning deadline (inf without a Lambda context)"""
+        if self.deadline is None:
+            return math.inf
+        return max(0.0, self.deadline - time.monotonic())
+
+    def allot(self, stage, cap=None, reserve=DELIVERY_RESERVE_SECONDS):
+        """Seconds an optional stage may use, or None (recorded as skipped) if too little is left
+
+        `reserve` is held back for the required stages that follow; `cap`
+        is the most the stage would ever want.
+        """
+        available = self.remaining() - reserve
+        minimum = OPTIONAL_STAGE_MIN_SECONDS.get(stage, 0.0)
+        if available < minimum:
+            self.skip(stage, f"{max(0.0, available):.1f}s available, needs {minimum:.1f}s")
+            return None
+        return available if cap is None else min(cap, available)
+
+    def skip(self, stage, reason):
+        """Record a skipped stage; repeats (one per batch target) are counted on one entry"""
+        print(f"⏭️ Skipping {stage}: {reason}")
+        with self._lock:
+            for entry in self.skipped:
+                if entry["stage"] == stage:
+                    entry["count"] += 1
+                    entry["reason"] = reason
+                    return
+            self.skipped.append({"stage": stage, "reason": reason, "count": 1})
+
+    def limit(self, seconds):
+        """Clamp a required stage's own timeout to the time that is left"""
+        return max(0.0, min(seconds, self.remaining()))
@@ -1,9 +1,37 @@
 # generate_mock_costs.py
+import argparse
 import json
 import random
 import datetime
 from collections import defaultdict
 
+try:
+    import numpy as np
+except ImportError:  # streaming mode falls back to random.Random
+    np = None
+
+DEFAULT_SERVICES = {
+    "AmazonEC2": 4.5,
+    "AmazonS3": 0.7,
+    "AmazonRDS": 2.0,
+    "AWSLambda": 0.3,
+    "AmazonEKS": 1.5,
+    "AmazonCloudFront": 0.4,
+    "Other": 0.2
+}
+DEFAULT_ACCOUNTS = ["account-A", "account-B", "account-C"]
+
+GRANULARITY_STEPS = {
+    "DAILY": datetime.timedelta(days=1),
+    "HOURLY": datetime.timedelta(hours=1)
+}
+
+# Periods generated per batch by the vectorized random source
+BATCH_PERIODS = 256
+# S3 multipart part size (minimum 5 MiB except for the last part)
+UPLOAD_PART_SIZE = 16 * 1024 * 1024
+
+
 def random_amount(base=5.0, volatility=0.5):
     # base is avg daily cost for a service; volatility fraction
     return round(max(0.01, random.normalvariate(base, base*volatility)), 2)
@@ -30,17 +58,9 @@ def build_dataset(days=365, start_date=None, services=None, accounts=None):
     if start_date is None:
         start_date = datetime.date.today() - datetime.timedelta(days=days)
     if services is None:
-        services = {
-            "AmazonEC2": 4.5,
-            "AmazonS3": 0.7,
-            "AmazonRDS": 2.0,
-            "AWSLambda": 0.3,
-            "AmazonEKS": 1.5,
-            "AmazonCloudFront": 0.4,
-            "Other": 0.2
-        }
+        services = DEFAULT_SERVICES
     if accounts is None:
-        accounts = ["account-A", "account-B", "account-C"]
+        accounts = DEFAULT_ACCOUNTS
     dataset = {"mocked": True, "generated_on": datetime.date.today().isoformat(), "ResultsByTime": []}
     for i in range(days):
         day = start_date + datetime.timedelta(days=i)
@@ -54,8 +74,202 @@ def build_dataset(days=365, start_date=None, services=None, accounts=None):
     dataset["total_days"] = days
     return dataset
 
+
+def make_services(count):
+    """The default services, padded with synthetic ones to reach `count`"""
+    services = dict(list(DEFAULT_SERVICES.items())[:count])
+    rng = random.Random(count)
+    for i in range(len(services), count):
+        services[f"Service-{i:03d}"] = round(rng.uniform(0.1, 3.0), 2)
+    return services
+
+
+def make_accounts(count):
+    if count <= len(DEFAULT_ACCOUNTS):
+        return DEFAULT_ACCOUNTS[:count]
+    return [f"account-{i:04d}" for i in range(count)]
+
+
+class AmountSource:
+    """Deterministic batches of per-(service, account) amounts
+
+    Uses NumPy's Generator when available, random.Random otherwise; the two
+    produce different (but individually reproducible) sequences for a seed.
+    """
+
+    def __init__(self, bases, seed, hourly=False):
+        # Hourly periods carry 1/24 of the daily base cost
+        self.bases = [base / 24.0 if hourly else base for base in bases]
+        if np is not None:
+            self.rng = np.random.default_rng(seed)
+            self.base_array = np.asarray(self.bases, dtype=np.float64)
+        else:
+            self.rng = random.Random(seed)
+
+    def batch(self, periods):
+        """Return `periods` rows of rounded amounts, one column per base"""
+        if np is not None:
+            scaled = self.base_array * self.rng.uniform(0.6, 1.6, size=(periods, len(self.bases)))
+            amounts = np.maximum(0.01, self.rng.normal(scaled, scaled * 0.6))
+            return np.round(amounts, 2).tolist()
+
+        rng = self.rng
+        rows = []
+        for _ in range(periods):
+            row = []
+            for base in self.bases:
+                scaled = base * rng.uniform(0.6, 1.6)
+                row.append(round(max(0.01, rng.normalvariate(scaled, scaled * 0.6)), 2))
+            rows.append(row)
+        return rows
+
+
+def _format_period(moment, granularity):
+    if granularity == "HOURLY":
+        return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return moment.date().isoformat()
+
+
+def iter_dataset_chunks(periods, start=None, services=None, accounts=None,
+                        granularity="DAILY", seed=0, details=True):
+    """Yield the JSON text of a mock cost document piece by piece
+
+    Details rows are rendered from pre-escaped fragments so the generator
+    never builds per-row dicts; memory stays bounded by one batch.
+    """
+    granularity = granularity.upper()
+    step = GRANULARITY_STEPS[granularity]
+    services = services or DEFAULT_SERVICES
+    accounts = accounts or DEFAULT_ACCOUNTS
+    if start is None:
+        start = datetime.datetime.combine(datetime.date.today(), datetime.time()) - step * periods
+
+    pairs = [(service, base, account) for service, base in services.items() for account in accounts]
+    source = AmountSource([base for _, base, _ in pairs], seed, hourly=granularity == "HOURLY")
+    # '"Account":"x","Service":"y","Total":{"BlendedCost":{"Amount":"' per pair
+    pair_fragments = [
+        f'"Account":{json.dumps(account)},"Service":{json.dumps(service)},"Total":{{"BlendedCost":{{"Amount":"'
+        for service, _, account in pairs
+    ]
+
+    yield json.dumps({
+        "mocked": True,
+        "generated_on": datetime.date.today().isoformat(),
+        "granularity": granularity,
+        "seed": seed
+    })[:-1] + ',"ResultsByTime":['
+
+    moment = start
+    for batch_start in range(0, periods, BATCH_PERIODS):
+        rows = source.batch(min(BATCH_PERIODS, periods - batch_start))
+        parts = []
+        for offset, row in enumerate(rows):
+            period = f'"TimePeriod":{{"Start":"{_format_period(moment, granularity)}","End":"{_format_period(moment + step, granularity)}"}}'
+            moment += step
+            entry = f'{{{period},"Total":{{"BlendedCost":{{"Amount":"{sum(row):.2f}","Unit":"USD"}}}}'
+            if details:
+                rendered = [f'{{{period},{fragment}{amount:.2f}","Unit":"USD"}}}}}}' for fragment, amount in zip(pair_fragments, row)]
+                entry += ',"Details":[' + ",".join(rendered) + "]"
+            parts.append(entry + "}")
+            if batch_start + offset + 1 < periods:
+                parts.append(",")
+        yield "".join(parts)
+
+    yield f'],"total_days":{periods}}}'
+
+
+class S3MultipartWriter:
+    """File-like writer that streams into an S3 (or S3-compatible) multipart upload"""
+
+    def __init__(self, s3, bucket, key, part_size=UPLOAD_PART_SIZE):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType="application/json")["UploadId"]
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.part_size:
+            self._upload_part()
+
+    def _upload_part(self):
+        number = len(self.parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=number, Body=bytes(self.buffer)
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": number})
+        self.buffer = bytearray()
+
+    def close(self):
+        if self.buffer or not self.parts:
+            self._upload_part()
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts}
+        )
+
+    def abort(self):
+        self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+def write_dataset(fp, periods, **options):
+    """Stream a mock cost document into a binary file-like object; returns bytes written"""
+    written = 0
+    for chunk in iter_dataset_chunks(periods, **options):
+        data = chunk.encode("utf-8")
+        fp.write(data)
+        written += len(data)
+    return written
+
+
+def upload_dataset(bucket, key, periods, endpoint_url=None, region=None, **options):
+    """Stream a mock cost document straight into S3 without a local copy"""
+    import boto3
+    s3 = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+    writer = S3MultipartWriter(s3, bucket, key)
+    try:
+        written = write_dataset(writer, periods, **options)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate mock Cost Explorer ResultsByTime data")
+    parser.add_argument("--days", type=int, default=730, help="days of history to generate")
+    parser.add_argument("--accounts", type=int, default=len(DEFAULT_ACCOUNTS))
+    parser.add_argument("--services", type=int, default=len(DEFAULT_SERVICES))
+    parser.add_argument("--granularity", choices=sorted(GRANULARITY_STEPS), default="DAILY")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-details", action="store_true", help="omit per-account Details rows")
+    parser.add_argument("--output", default="mock_costs_large.json", help="file path or s3://bucket/key")
+    parser.add_argument("--endpoint-url", help="S3-compatible endpoint for s3:// output")
+    args = parser.parse_args()
+
+    periods = args.days * (24 if args.granularity == "HOURLY" else 1)
+    options = {
+        "services": make_services(args.services),
+        "accounts": make_accounts(args.accounts),
+        "granularity": args.granularity,
+        "seed": args.seed,
+        "details": not args.no_details
+    }
+
+    if args.output.startswith("s3://"):
+        bucket, _, key = args.output[len("s3://"):].partition("/")
+        written = upload_dataset(bucket, key, periods, endpoint_url=args.endpoint_url, **options)
+    else:
+        with open(args.output, "wb") as f:
+            written = write_dataset(f, periods, **options)
+    print(f"Written {args.output} ({periods} {args.granularity.lower()} periods, "
+          f"{args.accounts} accounts x {args.services} services, {written / 1e6:.1f} MB).")
+
+
 if __name__ == "__main__":
-    ds = build_dataset(days=730)  # 2 years
-    with open("mock_costs_large.json", "w") as f:
-        json.dump(ds, f, indent=2)
-    print("Written mock_costs_large.json (2 years of daily data).")
+    main()
@@ -1,9 +1,40 @@
 import json
-import boto3
 import os
-import requests
+import posixpath
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from statistics import mean
+from clients import HTTP_POOL_SIZE, call_with_client
+from cost_series import as_cost_series
+from cost_analytics import ANALYSIS_WINDOW, summarize
+from cost_breakdown import breakdown
+from cost_forecast import project_costs
+from cost_state import read_cost_series
+from cost_partitions import PARTITION_FETCH_WORKERS, is_manifest_key, read_partitioned_series
+from cost_ingest import CE_GRANULARITY, CE_INGEST_MAX_SECONDS, ingest_cost_explorer
+from report_cache import is_not_modified, load_cached_report, load_cached_series, store_cached_report
+from summary_cache import SummaryCache, summary_fingerprint
+from summary_providers import SUMMARY_DEADLINE_SECONDS, generate_summary, get_summary_provider
+from deadline_budget import DeadlineBudget
+from prompt_digest import build_prompt_digest
+from instrumentation import Instrumentation
+from slack_delivery import SLACK_FLUSH_TIMEOUT_SECONDS, SlackDelivery
+from report_render import build_report_view, format_anomaly_flag, render_report, render_slack, select_sinks
+
+# Shared by warm invocations; mirrored to /tmp unless SUMMARY_CACHE_DIR is empty
+summary_cache = SummaryCache()
+# Slack posts are queued here and drained before each invocation returns
+slack_delivery = SlackDelivery()
+
+# Upper bound on reports read and analyzed at once in batch mode
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", "8"))
+# Slack rejects section text longer than 3000 characters
+SLACK_SECTION_LIMIT = 3000
+# "cost_explorer" pulls fresh data from Cost Explorer into the partitioned store
+# behind COST_REPORT_KEY before each report; "s3" reads the uploaded report as is
+COST_SOURCE = os.environ.get("COST_SOURCE", "s3").lower()
+# Extra renderings of the report returned with the result, e.g. "html,json"
+REPORT_RENDER_SINKS = os.environ.get("REPORT_RENDER_SINKS", "")
 
 def lambda_handler(event, context):
     print("🚀 Enhanced Cost Manager Lambda started")
@@ -24,43 +55,340 @@ def lambda_handler(event, context):
     # Get report interval from event or environment (default to 60 minutes for backward compatibility)
     report_interval_minutes = int(event.get('report_interval_minutes', os.environ.get('REPORT_INTERVAL_MINUTES', 60)))
 
-    # Read cost data from S3
-    print(f"📂 Reading {key} from {bucket_name}")
-    s3 = boto3.client("s3", region_name=region)
+    # Time left in this invocation, shared out between stages; optional ones are skipped when it runs low
+    deadline = DeadlineBudget(context)
+    # Slack retries stop at the same deadline; anything a previous invocation left behind is dropped
+    slack_delivery.begin(deadline.deadline)
+
+    # Checked up front: nothing may raise once the report is on its way to Slack,
+    # or EventBridge's retry of the failed invocation posts it again
+    render_sinks = select_sinks((event or {}).get("render_sinks", REPORT_RENDER_SINKS))
+
+    # Many reports (keys and/or prefixes) in one invocation
+    if event and (event.get("report_keys") or event.get("report_prefixes")):
+        result = run_batch_report(
+            event, bucket_name, region, monthly_budget, report_interval_minutes,
+            slack_webhook, google_api_key, model_name, deadline, render_sinks
+        )
+        result["slack"] = slack_delivery.flush(deadline.limit(SLACK_FLUSH_TIMEOUT_SECONDS))
+        if result["slack"]["failed"]:
+            result["status"] = "partial"
+        result["skipped_stages"] = deadline.skipped
+        return result
+
+    # Ingest-only run, e.g. {"ingest": {"granularity": "HOURLY", "force": true}}
+    if event and event.get("ingest") is not None:
+        return run_ingest(event["ingest"] or {}, bucket_name, key, region, deadline)
+
+    # Stage timings (COST_REPORT_METRICS=true); a no-op when disabled
+    instruments = Instrumentation()
+
+    if COST_SOURCE == "cost_explorer" and not is_manifest_key(key):
+        print(f"⚠️ COST_SOURCE=cost_explorer needs a partition manifest key, not {key}; skipping ingest")
+    elif COST_SOURCE == "cost_explorer":
+        ingest_seconds = deadline.allot("cost_explorer_ingest", cap=CE_INGEST_MAX_SECONDS)
+        if ingest_seconds is not None:
+            try:
+                with instruments.stage("cost_explorer_ingest"):
+                    ingest_cost_explorer(bucket_name, key, region, time_limit=ingest_seconds)
+            except Exception as e:
+                # A stale report beats no report; the store still holds the last ingest
+                print(f"⚠️ Cost Explorer ingest failed, reporting on stored data: {e}")
 
     try:
-        response = s3.get_object(Bucket=bucket_name, Key=key)
-        cost_data = json.loads(response["Body"].read().decode("utf-8"))
-        print("✅ Cost data loaded successfully")
+        report = load_report(bucket_name, key, region, monthly_budget, report_interval_minutes, instruments)
     except Exception as e:
         print(f"❌ Error reading S3: {e}")
         send_error_to_slack(slack_webhook, f"Failed to read cost data: {str(e)}")
+        slack_delivery.flush(deadline.limit(SLACK_FLUSH_TIMEOUT_SECONDS))
+        instruments.emit({"ReportKey": key})
+        instruments.close()
         return {"status": "error", "message": str(e)}
 
+    analysis = report["analysis"]
+    anomaly_alert = report["anomaly"]
+
+    # Bounded digest of the series for the AI prompt (recent window, top services/accounts)
+    prompt_data = build_prompt_digest(report["series"])
+
+    pipeline_mode = (event or {}).get("pipeline_mode", os.environ.get("PIPELINE_MODE", "sequential"))
+
+    # Seconds the AI summary may take without eating into Slack delivery; 0 leaves only the summary cache
+    summary_seconds = deadline.allot("generate_ai_summary", cap=SUMMARY_DEADLINE_SECONDS) or 0.0
+
+    if pipeline_mode == "concurrent":
+        # Alert first, then follow up with the AI summary once Gemini answers
+        with instruments.stage("concurrent_delivery") as stage:
+            ai_summary = run_concurrent_delivery(
+                slack_webhook, prompt_data, analysis, anomaly_alert,
+                monthly_budget, google_api_key, model_name, summary_seconds
+            )
+            stage.bytes_out = len(ai_summary)
+    else:
+        # Generate AI summary with enhanced prompt
+        with instruments.stage("generate_ai_summary") as stage:
+            ai_summary = generate_ai_summary(prompt_data, analysis, google_api_key, model_name, summary_seconds)
+            stage.bytes_out = len(ai_summary)
+
+        # Send enhanced Slack message
+        with instruments.stage("slack_post"):
+            send_enhanced_slack_message(
+                slack_webhook,
+                ai_summary,
+                analysis,
+                anomaly_alert,
+                monthly_budget
+            )
+
+    # Queued Slack posts must land before the container is frozen
+    with instruments.stage("slack_flush"):
+        slack_stats = slack_delivery.flush(deadline.limit(SLACK_FLUSH_TIMEOUT_SECONDS))
+
+    # Same report for email/dashboard consumers, rendered from the view the Slack message used
+    renders = None
+    if render_sinks and deadline.allot("render_sinks", reserve=0) is not None:
+        try:
+            view = build_report_view(analysis, anomaly_alert, monthly_budget, ai_summary)
+            renders = {sink: render_report(view, sink) for sink in render_sinks}
+        except Exception as e:
+            print(f"⚠️ Could not render report for {', '.join(render_sinks)}: {e}")
+
+    for skipped in deadline.skipped:
+        instruments.record(skipped["stage"], 0.0, skipped=True)
+
+    instruments.emit({"ReportKey": key})
+    instruments.close()
+
+    if slack_stats["failed"]:
+        print(f"⚠️ Cost report completed, but {slack_stats['failed']} Slack messages were not delivered")
+    else:
+        print("✅ Cost report completed successfully")
+    result = {
+        "status": "partial" if slack_stats["failed"] else "success",
+        "summary": ai_summary,
+        "total_cost": analysis.get("total_cost", 0),
+        "anomaly_detected": anomaly_alert is not None,
+        "slack": slack_stats,
+        "skipped_stages": deadline.skipped
+    }
+    if renders is not None:
+        result["renders"] = renders
+    if instruments.enabled:
+        result["timings"] = instruments.timings()
+    return result
+
+
+def run_ingest(options, bucket_name, key, region, deadline=None):
+    """Pull Cost Explorer data into the partitioned store without reporting"""
+    deadline = deadline or DeadlineBudget()
+    manifest_key = options.get("manifest_key", key)
+    if not is_manifest_key(manifest_key):
+        return {"status": "error", "message": f"{manifest_key} is not a partition manifest"}
+    start = options.get("start")
+    end = options.get("end")
+    try:
+        result = ingest_cost_explorer(
+            bucket_name, manifest_key, region,
+            start=datetime.fromisoformat(start).date() if start else None,
+            end=datetime.fromisoformat(end).date() if end else None,
+            granularity=options.get("granularity", CE_GRANULARITY).upper(),
+            force=bool(options.get("force")),
+            time_limit=deadline.remaining()
+        )
+    except Exception as e:
+        print(f"❌ Cost Explorer ingest failed: {e}")
+        return {"status": "error", "message": str(e)}
+    result["manifest_key"] = manifest_key
+    return result
+
+
+def load_report(bucket_name, key, region, monthly_budget, report_interval_minutes, instruments=None,
+                fetch_workers=PARTITION_FETCH_WORKERS):
+    """Read one cost report and compute its analysis and anomaly check
+
+    fetch_workers bounds the parallel partition downloads of a partitioned
+    report. Raises if the report cannot be read from S3.
+    """
+    instruments = instruments or Instrumentation(enabled=False)
+
+    # Read cost data from S3
+    print(f"📂 Reading {key} from {bucket_name}")
+
+    # Analysis from a previous warm invocation is reusable while the object's ETag is unchanged
+    cache_params = {"monthly_budget": monthly_budget, "interval_minutes": report_interval_minutes}
+    cached = load_cached_report(bucket_name, key, cache_params)
+
+    not_modified = False
+    if cached:
+        with instruments.stage("s3_conditional_get"):
+            not_modified = call_with_client("s3", lambda s3: is_not_modified(s3, bucket_name, key, cached), region)
+    series = load_cached_series(bucket_name, key, cached, ANALYSIS_WINDOW) if not_modified else None
+    if series is not None:
+        print("♻️ Cost report not modified, reusing cached analysis")
+        return {"key": key, "series": series, "analysis": cached["analysis"], "anomaly": cached["anomaly"]}
+
+    # Stream the report into a CostSeries, folding in only periods newer than the saved snapshot;
+    # a partitioned report (key ending in manifest.json) reads only the partitions in the window
+    # The S3 client is cached at module scope and reused by warm invocations
+    if is_manifest_key(key):
+        def read_series(s3):
+            return read_partitioned_series(s3, bucket_name, key, fetch_workers=fetch_workers)
+    else:
+        def read_series(s3):
+            return read_cost_series(s3, bucket_name, key)
+    read_start = time.perf_counter()
+    series, read_info = call_with_client("s3", read_series, region)
+    read_seconds = time.perf_counter() - read_start
+    # Fetch and decode are interleaved while streaming: the readers time their own S3 calls
+    # (report request and body reads, snapshot load and save) and decoding is what is left
+    s3_seconds = read_info["read_seconds"]
+    for stage in ("state_load", "state_save"):
+        if f"{stage}_seconds" in read_info:
+            instruments.record(stage, read_info[f"{stage}_seconds"])
+            s3_seconds += read_info[f"{stage}_seconds"]
+    instruments.record("s3_fetch", read_info["read_seconds"], bytes_in=read_info["bytes_read"])
+    instruments.record("json_decode", max(0.0, read_seconds - s3_seconds), bytes_in=read_info["bytes_read"])
+    print(f"✅ Cost data loaded successfully ({read_info['mode']}, {read_info['bytes_read']} bytes, {read_info['new_periods']} new periods)")
+
     # Analyze cost data
-    analysis = analyze_costs(cost_data, monthly_budget, report_interval_minutes)
+    with instruments.stage("analyze_costs"):
+        analysis = analyze_costs(series, monthly_budget, report_interval_minutes)
 
     # Check for anomalies
-    anomaly_alert = detect_anomalies(cost_data)
-
-    # Generate AI summary with enhanced prompt
-    ai_summary = generate_ai_summary(cost_data, analysis, google_api_key, model_name)
-
-    # Send enhanced Slack message
-    send_enhanced_slack_message(
-        slack_webhook,
-        ai_summary,
-        analysis,
-        anomaly_alert,
-        monthly_budget
+    with instruments.stage("detect_anomalies"):
+        anomaly_alert = detect_anomalies(series)
+
+    store_cached_report(
+        bucket_name, key, cache_params, read_info["etag"], read_info["last_modified"],
+        series, analysis, anomaly_alert
     )
-    
-    print("✅ Cost report completed successfully")
+    return {"key": key, "series": series, "analysis": analysis, "anomaly": anomaly_alert}
+
+
+def resolve_batch_targets(event, bucket_name, region, monthly_budget):
+    """Expand report_keys and report_prefixes into (key, monthly_budget) targets
+
+    report_keys entries are either keys or {"key": ..., "monthly_budget": ...}.
+    """
+    targets = {}
+    for entry in event.get("report_keys", []):
+        if isinstance(entry, dict):
+            targets[entry["key"]] = float(entry.get("monthly_budget", monthly_budget))
+        else:
+            targets[entry] = monthly_budget
+
+    def list_prefix(s3, prefix):
+        keys = []
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket_name, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                # Skip the aggregate snapshots that live next to each report
+                if obj["Key"].endswith(".json") and not obj["Key"].endswith(".state.json"):
+                    keys.append(obj["Key"])
+        return keys
+
+    for prefix in event.get("report_prefixes", []):
+        keys = call_with_client("s3", lambda s3: list_prefix(s3, prefix), region)
+        # Partition objects are read through their manifest, not as reports of their own
+        partitioned = {posixpath.dirname(k) for k in keys if is_manifest_key(k)}
+        for key in keys:
+            if is_manifest_key(key) or posixpath.dirname(key) not in partitioned:
+                targets.setdefault(key, monthly_budget)
+    return sorted(targets.items())
+
+
+def _run_batch_target(target, bucket_name, region, interval_minutes, output, slack_webhook, api_key, model_name,
+                      deadline, render_sinks=(), fetch_workers=PARTITION_FETCH_WORKERS):
+    key, budget = target
+    try:
+        report = load_report(bucket_name, key, region, budget, interval_minutes, fetch_workers=fetch_workers)
+    except Exception as e:
+        print(f"❌ Error reading {key}: {e}")
+        return {"key": key, "status": "error", "message": str(e)}
+
+    ai_summary = None
+    if output == "per_target":
+        summary_seconds = deadline.allot("generate_ai_summary", cap=SUMMARY_DEADLINE_SECONDS) or 0.0
+        ai_summary = generate_ai_summary(build_prompt_digest(report["series"]), report["analysis"],
+                                         api_key, model_name, summary_seconds)
+        send_enhanced_slack_message(slack_webhook, ai_summary, report["analysis"], report["anomaly"], budget, report_name=key)
+
+    result = {
+        "key": key,
+        "status": "success",
+        "monthly_budget": budget,
+        "total_cost": report["analysis"].get("total_cost", 0),
+        "budget_usage": report["analysis"].get("budget_usage", 0),
+        "trend": report["analysis"].get("trend", "stable"),
+        "anomaly": report["anomaly"]
+    }
+    # Each target gets its own render, with the AI summary only in per_target output
+    if render_sinks and deadline.allot("render_sinks") is not None:
+        try:
+            view = build_report_view(report["analysis"], report["anomaly"], budget, ai_summary, report_name=key)
+            result["renders"] = {sink: render_report(view, sink) for sink in render_sinks}
+        except Exception as e:
+            print(f"⚠️ Could not render {key} for {', '.join(render_sinks)}: {e}")
+    return result
+
+
+def run_batch_report(event, bucket_name, region, monthly_budget, interval_minutes, slack_webhook, api_key, model_name,
+                     deadline=None, render_sinks=()):
+    """Analyze many reports concurrently and send per-target or consolidated Slack output
+
+    Workers share the module-level S3 client and HTTP session; together
+    with their partition downloads they stay within HTTP_POOL_SIZE
+    connections. render_sinks are rendered per target into its "renders".
+    """
+    deadline = deadline or DeadlineBudget()
+    output = event.get("batch_output", os.environ.get("BATCH_OUTPUT", "consolidated"))
+    max_workers = int(event.get("max_workers", BATCH_MAX_WORKERS))
+
+    try:
+        targets = resolve_batch_targets(event, bucket_name, region, monthly_budget)
+    except Exception as e:
+        print(f"❌ Error listing report prefixes: {e}")
+        send_error_to_slack(slack_webhook, f"Failed to list cost reports: {str(e)}")
+        return {"status": "error", "message": str(e)}
+    print(f"📚 Batch of {len(targets)} reports ({output} output, {max_workers} workers)")
+
+    results = []
+    if targets:
+        workers = max(1, min(max_workers, len(targets), HTTP_POOL_SIZE))
+        # Each worker may download partitions in parallel: split the S3 pool between them
+        fetch_workers = max(1, min(PARTITION_FETCH_WORKERS, HTTP_POOL_SIZE // workers))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_run_batch_target, target, bucket_name, region, interval_minutes,
+                            output, slack_webhook, api_key, model_name, deadline, render_sinks, fetch_workers)
+                for target in targets
+            ]
+            results = [future.result() for future in futures]
+
+    failed = [r for r in results if r["status"] != "success"]
+    if output != "per_target":
+        send_batch_slack_message(slack_webhook, results)
+    if failed:
+        send_error_to_slack(slack_webhook, "Failed to read: " + ", ".join(r["key"] for r in failed))
+
+    reports = []
+    for r in results:
+        report = {
+            "key": r["key"],
+            "status": r["status"],
+            "total_cost": r.get("total_cost", 0),
+            "anomaly_detected": r.get("anomaly") is not None
+        }
+        if "message" in r:
+            report["message"] = r["message"]
+        if "renders" in r:
+            report["renders"] = r["renders"]
+        reports.append(report)
+
+    print(f"✅ Batch completed: {len(results) - len(failed)} ok, {len(failed)} failed")
     return {
-        "status": "success", 
-        "summary": ai_summary,
-        "total_cost": analysis.get("total_cost", 0),
-        "anomaly_detected": anomaly_alert is not None
+        "status": "success" if not failed else "partial",
+        "reports": reports,
+        "failed": len(failed)
     }
 
 
@@ -71,57 +399,79 @@ def analyze_costs(cost_data, monthly_budget, interval_minutes=60):
         "interval_cost": 0,
         "daily_costs": [],
         "top_services": [],
+        "top_accounts": [],
         "trend": "stable",
         "budget_usage": 0,
-        "projected_monthly": 0
+        "projected_monthly": 0,
+        "rolling_avg": 0,
+        "trend_slope": 0,
+        "projected_monthly_trend": 0,
+        "p50_cost": 0,
+        "p90_cost": 0
     }
     
     try:
-        # Extract total cost (adjust based on your JSON structure)
-        if isinstance(cost_data, dict):
-            # Try common cost data structures
-            if "ResultsByTime" in cost_data:
-                total = 0
-                daily_costs = []
-                for result in cost_data["ResultsByTime"]:
-                    amount = float(result.get("Total", {}).get("BlendedCost", {}).get("Amount", 0))
-                    total += amount
-                    daily_costs.append(amount)
-                analysis["total_cost"] = round(total, 2)
-                analysis["daily_costs"] = daily_costs
-            elif "total" in cost_data:
-                analysis["total_cost"] = float(cost_data["total"])
-            
-            # Calculate trend
-            if len(analysis["daily_costs"]) >= 2:
-                recent_avg = mean(analysis["daily_costs"][-3:]) if len(analysis["daily_costs"]) >= 3 else analysis["daily_costs"][-1]
-                older_avg = mean(analysis["daily_costs"][:3]) if len(analysis["daily_costs"]) >= 3 else analysis["daily_costs"][0]
-                
-                if recent_avg > older_avg * 1.15:
-                    analysis["trend"] = "increasing"
-                elif recent_avg < older_avg * 0.85:
-                    analysis["trend"] = "decreasing"
-            
-            # Project monthly cost
-            if analysis["daily_costs"]:
-                avg_daily = mean(analysis["daily_costs"])
+        # Accept a pre-aggregated CostSeries or a raw cost document
+        series = as_cost_series(cost_data)
+
+        if series.count:
+            analysis["total_cost"] = round(series.total, 2)
+            analysis["daily_costs"] = series.amounts[-ANALYSIS_WINDOW:].tolist()
+        elif "total" in series.meta:
+            analysis["total_cost"] = float(series.meta["total"])
+
+        # Top services/accounts and their share of spend (from Details or Groups)
+        analysis.update(breakdown(series))
+
+        # Calculate trend
+        if series.count >= 2:
+            window = 3 if series.count >= 3 else 1
+            recent_avg = series.tail_mean(window)
+            older_avg = series.head_mean(window)
+
+            if recent_avg > older_avg * 1.15:
+                analysis["trend"] = "increasing"
+            elif recent_avg < older_avg * 0.85:
+                analysis["trend"] = "decreasing"
+
+        if series.count:
+            # Holt-Winters month-end and next-interval projections with confidence bands
+            projection = project_costs(series, interval_minutes)
+            if projection:
+                analysis["forecast_model"] = "holt_winters"
+                analysis["projected_monthly"] = round(projection["month_end"], 2)
+                analysis["projected_monthly_low"] = round(projection["month_end_low"], 2)
+                analysis["projected_monthly_high"] = round(projection["month_end_high"], 2)
+                analysis["month_to_date"] = round(projection["month_to_date"], 2)
+                analysis["interval_cost"] = round(projection["interval"], 4)
+                analysis["interval_cost_low"] = round(projection["interval_low"], 4)
+                analysis["interval_cost_high"] = round(projection["interval_high"], 4)
+            else:
+                # Too little history for the model (or FORECAST_MODEL=average)
+                avg_daily = series.mean()
+                analysis["forecast_model"] = "average"
+
+                # Project monthly cost
                 analysis["projected_monthly"] = round(avg_daily * 30, 2)
-            
-            # Calculate interval cost (cost for the last interval period)
-            if analysis["daily_costs"]:
+
+                # Calculate interval cost (cost for the last interval period)
                 # Convert interval minutes to hours for calculation
                 interval_hours = interval_minutes / 60.0
                 # Estimate cost per hour from daily data
-                avg_daily = mean(analysis["daily_costs"])
                 avg_hourly = avg_daily / 24.0
                 analysis["interval_cost"] = round(avg_hourly * interval_hours, 4)
 
             # Calculate budget usage
             if monthly_budget > 0:
-                days_in_month = 30
-                days_passed = len(analysis["daily_costs"])
-                if days_passed > 0:
-                    analysis["budget_usage"] = round((analysis["total_cost"] / monthly_budget) * 100, 1)
+                analysis["budget_usage"] = round((analysis["total_cost"] / monthly_budget) * 100, 1)
+
+            # Rolling average, trend line and percentiles over the trailing window
+            stats = summarize(series.amounts[-ANALYSIS_WINDOW:])
+            analysis["rolling_avg"] = round(stats["rolling_avg"], 2)
+            analysis["trend_slope"] = round(stats["trend_slope"], 4)
+            analysis["projected_monthly_trend"] = round(stats["projected_trend"], 2)
+            analysis["p50_cost"] = round(stats["p50"], 2)
+            analysis["p90_cost"] = round(stats["p90"], 2)
 
         print(f"📊 Analysis complete: ${analysis['total_cost']} | Interval: ${analysis['interval_cost']} | Trend: {analysis['trend']}")
 
@@ -134,19 +484,18 @@ def analyze_costs(cost_data, monthly_budget, interval_minutes=60):
 def detect_anomalies(cost_data):
     """Detect cost anomalies and spikes"""
     try:
-        daily_costs = []
-        
-        if isinstance(cost_data, dict) and "ResultsByTime" in cost_data:
-            for result in cost_data["ResultsByTime"]:
-                amount = float(result.get("Total", {}).get("BlendedCost", {}).get("Amount", 0))
-                daily_costs.append(amount)
-        
-        if len(daily_costs) < 2:
+        series = as_cost_series(cost_data)
+
+        # Seasonal baselines per service/account, updated as each period was read
+        if series.anomalies is not None and series.anomalies.ready():
+            return series.anomalies.report()
+
+        if series.count < 2:
             return None
         
         # Check if latest cost is significantly higher than average
-        latest_cost = daily_costs[-1]
-        avg_cost = mean(daily_costs[:-1]) if len(daily_costs) > 1 else daily_costs[0]
+        latest_cost = series.latest()
+        avg_cost = (series.total - latest_cost) / (series.count - 1)
         
         if latest_cost > avg_cost * 1.3:  # 30% increase threshold
             spike_percentage = round(((latest_cost - avg_cost) / avg_cost) * 100, 1)
@@ -164,10 +513,22 @@ def detect_anomalies(cost_data):
         return None
 
 
-def generate_ai_summary(cost_data, analysis, api_key, model_name):
-    """Generate AI-powered cost summary"""
+def generate_ai_summary(cost_data, analysis, api_key, model_name, deadline=SUMMARY_DEADLINE_SECONDS):
+    """Generate AI-powered cost summary, giving up for the fallback after `deadline` seconds"""
     interval_cost = analysis.get('interval_cost', 0)
     interval_text = f"${interval_cost:.4f}" if interval_cost > 0 else "N/A"
+    # cost_data is normally the bounded digest; the cap only guards raw documents
+    raw_data = json.dumps(cost_data, separators=(",", ":"))[:15000]
+
+    # Same analysis and data as a recent run: reuse that summary instead of calling Gemini
+    fingerprint = summary_fingerprint(model_name, analysis, raw_data)
+    cached_summary = summary_cache.get(fingerprint)
+    if cached_summary:
+        print("♻️ Reusing cached AI summary")
+        return cached_summary
+    if deadline <= 0:
+        # No time left for a provider call (see DeadlineBudget)
+        return generate_fallback_summary(analysis)
 
     prompt = f"""
 You are an AWS cost optimization expert. Analyze this cost data and provide a CONCISE, actionable summary.
@@ -195,31 +556,28 @@ Provide your response in this EXACT format:
 
 Keep it under 250 words. Be specific and actionable. Focus on the recent interval cost.
 
-Raw data (first 15000 chars):
-{json.dumps(cost_data)[:15000]}
+Cost data digest (covered range, recent periods, top services and accounts):
+{raw_data}
 """
     
     try:
-        gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
-        payload = {"contents": [{"parts": [{"text": prompt}]}]}
-        headers = {"Content-Type": "application/json"}
-        
-        print("🤖 Generating AI summary...")
-        ai_resp = requests.post(gemini_url, headers=headers, json=payload, timeout=60)
-        
-        if ai_resp.status_code == 200:
-            ai_data = ai_resp.json()
-            summary = ai_data["candidates"][0]["content"]["parts"][0]["text"]
-            print("✅ AI summary generated")
-            return summary
-        else:
-            print(f"⚠️ Gemini API error: {ai_resp.status_code}")
-            return generate_fallback_summary(analysis)
-            
+        provider = get_summary_provider(api_key, model_name)
+        print(f"🤖 Generating AI summary ({provider.name})...")
+        # Bounded by `deadline`, with a hedged second request if the first is slow
+        summary, complete = generate_summary(provider, prompt, deadline)
     except Exception as e:
         print(f"❌ AI generation failed: {e}")
         return generate_fallback_summary(analysis)
 
+    if summary is None:
+        return generate_fallback_summary(analysis)
+    if complete:
+        print("✅ AI summary generated")
+        summary_cache.put(fingerprint, summary)
+    else:
+        print("✂️ Using the partial AI summary streamed before the deadline")
+    return summary
+
 
 def generate_fallback_summary(analysis):
     """Generate a basic summary if AI fails"""
@@ -241,186 +599,143 @@ Total spending: ${analysis.get('total_cost', 0)} | Last interval cost: {interval
 4. Enable cost allocation tags for better visibility"""
 
 
-def create_budget_bar(percentage):
-    """Create a visual progress bar for budget"""
-    filled = int(percentage / 5)  # 20 blocks for 100%
-    empty = 20 - filled
-    
-    if percentage < 50:
-        emoji = "🟢"
-    elif percentage < 80:
-        emoji = "🟡"
-    else:
-        emoji = "🔴"
-    
-    bar = "█" * filled + "░" * empty
-    return f"{emoji} {bar} {percentage}%"
+def send_enhanced_slack_message(webhook_url, ai_summary, analysis, anomaly, budget, report_name=None):
+    """Send beautifully formatted message to Slack"""
+    view = build_report_view(analysis, anomaly, budget, ai_summary, report_name)
 
+    # Queue for Slack; the simple text goes out instead if the blocks are rejected
+    fallback = f"📊 *AWS Cost Report*\n\n{ai_summary or generate_fallback_summary(analysis)}"
+    slack_delivery.enqueue(webhook_url, render_slack(view), fallback, "Enhanced report")
 
-def send_enhanced_slack_message(webhook_url, ai_summary, analysis, anomaly, budget):
-    """Send beautifully formatted message to Slack"""
-    
+
+def send_ai_summary_message(webhook_url, ai_summary):
+    """Send the AI summary as a follow-up to an already delivered metrics report"""
     current_time = datetime.now().strftime("%B %d, %Y at %I:%M %p UTC")
-    
-    # Build blocks
     blocks = [
         {
             "type": "header",
             "text": {
                 "type": "plain_text",
-                "text": "📊 AWS Cost Intelligence Report",
+                "text": "🤖 AI Cost Summary",
                 "emoji": True
             }
+        },
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": ai_summary
+            }
+        },
+        {
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"🤖 AI-Powered Analysis • 📅 {current_time}"
+                }
+            ]
         }
     ]
-    
-    # Anomaly alert (if detected)
-    if anomaly:
-        blocks.append({
+
+    slack_delivery.enqueue(webhook_url, {"blocks": blocks}, f"🤖 *AI Cost Summary*\n\n{ai_summary}", "AI summary")
+
+
+def send_batch_slack_message(webhook_url, results):
+    """Send one consolidated Slack message covering every report in a batch"""
+    current_time = datetime.now().strftime("%B %d, %Y at %I:%M %p UTC")
+    trend_emojis = {"increasing": "📈", "decreasing": "📉", "stable": "➡️"}
+
+    ok = sorted((r for r in results if r["status"] == "success"), key=lambda r: r["total_cost"], reverse=True)
+    lines = []
+    for r in ok:
+        flag = f" ⚠️ {format_anomaly_flag(r['anomaly'])}" if r["anomaly"] else ""
+        lines.append(
+            f"{trend_emojis.get(r['trend'], '➡️')} `{r['key']}` *${r['total_cost']}* "
+            f"({r['budget_usage']}% of ${r['monthly_budget']}){flag}"
+        )
+    for r in results:
+        if r["status"] != "success":
+            lines.append(f"❌ `{r['key']}` could not be read")
+
+    blocks = [
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": "📊 AWS Cost Intelligence Report",
+                "emoji": True
+            }
+        },
+        {
             "type": "section",
             "text": {
                 "type": "mrkdwn",
-                "text": f"⚠️ *COST SPIKE DETECTED*\n🔺 Spending increased by *{anomaly['increase']}%*\nCurrent: ${anomaly['current']} | Average: ${anomaly['average']}"
+                "text": f"*{len(results)} reports* • Combined spend: *${round(sum(r['total_cost'] for r in ok), 2)}* • "
+                        f"Anomalies: *{sum(1 for r in ok if r['anomaly'])}*"
             }
-        })
-        blocks.append({"type": "divider"})
-    
-    # Budget tracker
-    budget_percentage = analysis.get("budget_usage", 0)
-    budget_bar = create_budget_bar(budget_percentage)
-    
-    blocks.append({
-        "type": "section",
-        "text": {
-            "type": "mrkdwn",
-            "text": f"*💳 Budget Tracker*\n```{budget_bar}```\nSpent: *${analysis.get('total_cost', 0)}* of ${budget} monthly budget"
-        }
-    })
-    
-    blocks.append({"type": "divider"})
-    
-    # AI Summary
-    blocks.append({
-        "type": "section",
-        "text": {
-            "type": "mrkdwn",
-            "text": ai_summary
-        }
-    })
-    
-    # Cost metrics
-    trend_emoji = {"increasing": "📈", "decreasing": "📉", "stable": "➡️"}.get(analysis.get("trend", "stable"), "➡️")
-    interval_cost = analysis.get('interval_cost', 0)
-    interval_display = f"${interval_cost:.4f}" if interval_cost > 0 else "N/A"
+        },
+        {"type": "divider"}
+    ]
+
+    # Pack report lines into as few sections as Slack's text limit allows
+    section = ""
+    for line in lines:
+        if section and len(section) + len(line) + 1 > SLACK_SECTION_LIMIT:
+            blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": section}})
+            section = ""
+        section = f"{section}\n{line}" if section else line
+    if section:
+        blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": section}})
 
     blocks.append({
-        "type": "section",
-        "fields": [
-            {
-                "type": "mrkdwn",
-                "text": f"*Current Spend*\n${analysis.get('total_cost', 0)}"
-            },
-            {
-                "type": "mrkdwn",
-                "text": f"*Interval Cost*\n{interval_display}"
-            },
-            {
-                "type": "mrkdwn",
-                "text": f"*Trend*\n{trend_emoji} {analysis.get('trend', 'stable').title()}"
-            },
-            {
-                "type": "mrkdwn",
-                "text": f"*Projected Monthly*\n${analysis.get('projected_monthly', 0)}"
-            },
+        "type": "context",
+        "elements": [
             {
                 "type": "mrkdwn",
-                "text": f"*Budget Remaining*\n${max(0, budget - analysis.get('total_cost', 0))}"
+                "text": f"📊 Batch Report • 📅 {current_time}"
             }
         ]
     })
-    
-    blocks.append({"type": "divider"})
-    
-    # Action buttons
-    blocks.append({
-        "type": "actions",
-        "elements": [
+
+    slack_delivery.enqueue(webhook_url, {"blocks": blocks}, "📊 *AWS Cost Intelligence Report*\n\n" + "\n".join(lines),
+                           "Batch report")
+
+def run_concurrent_delivery(webhook_url, cost_data, analysis, anomaly, budget, api_key, model_name,
+                            summary_seconds=SUMMARY_DEADLINE_SECONDS):
+    """Post the deterministic report while Gemini runs, then the AI summary
+
+    Time-to-first-alert no longer waits on the Gemini call.
+    """
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        summary_future = pool.submit(generate_ai_summary, cost_data, analysis, api_key, model_name, summary_seconds)
+        send_enhanced_slack_message(webhook_url, None, analysis, anomaly, budget)
+        ai_summary = summary_future.result()
+
+    send_ai_summary_message(webhook_url, ai_summary)
+    return ai_summary
+
+
+def send_error_to_slack(webhook_url, error_message):
+    """Send error notification to Slack"""
+    message = {
+        "blocks": [
             {
-                "type": "button",
+                "type": "header",
                 "text": {
                     "type": "plain_text",
-                    "text": "📊 View Details",
+                    "text": "⚠️ Cost Report Error",
                     "emoji": True
-                },
-                "value": "view_details",
-                "url": f"https://console.aws.amazon.com/cost-management/home?region={os.environ.get('AWS_REGION', 'us-east-1')}#/cost-explorer"
+                }
             },
             {
-                "type": "button",
+                "type": "section",
                 "text": {
-                    "type": "plain_text",
-                    "text": "💡 Optimization Tips",
-                    "emoji": True
-                },
-                "value": "optimization_tips",
-                "url": "https://aws.amazon.com/aws-cost-management/cost-optimization/"
-            }
-        ]
-    })
-    
-    # Footer
-    blocks.append({
-        "type": "context",
-        "elements": [
-            {
-                "type": "mrkdwn",
-                "text": f"🤖 AI-Powered Analysis • 📅 {current_time}"
+                    "type": "mrkdwn",
+                    "text": f"```{error_message}```"
+                }
             }
         ]
-    })
-    
-    # Send to Slack
-    try:
-        response = requests.post(
-            webhook_url, 
-            json={"blocks": blocks},
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            print("✅ Enhanced report sent to Slack")
-        else:
-            print(f"⚠️ Slack responded with {response.status_code}")
-            # Fallback to simple message
-            simple_msg = {"text": f"📊 *AWS Cost Report*\n\n{ai_summary}"}
-            requests.post(webhook_url, json=simple_msg, timeout=10)
-            
-    except Exception as e:
-        print(f"❌ Failed to send to Slack: {e}")
-
-
-def send_error_to_slack(webhook_url, error_message):
-    """Send error notification to Slack"""
-    try:
-        message = {
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "⚠️ Cost Report Error",
-                        "emoji": True
-                    }
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"```{error_message}```"
-                    }
-                }
-            ]
-        }
-        requests.post(webhook_url, json=message, timeout=10)
-    except:
-        pass  # Fail silently if Slack notification fails
\ No newline at end of file
+    }
+    slack_delivery.enqueue(webhook_url, message, f"⚠️ Cost Report Error: {error_message}", "Error notification")
+    
\ No newline at end of file
@@ -0,0 +1,121 @@
+# instrumentation.py
+import json
+import os
+import time
+import tracemalloc
+
+METRICS_ENABLED = os.environ.get("COST_REPORT_METRICS", "false").lower() == "true"
+TRACE_MEMORY = os.environ.get("COST_REPORT_TRACE_MEMORY", "false").lower() == "true"
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "CostReport")
+
+
+class _NullStage:
+    """Stand-in returned when instrumentation is off, so stages cost one call"""
+
+    bytes_in = None
+    bytes_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Stage:
+    """Times one pipeline stage; set bytes_in/bytes_out inside the block if known"""
+
+    __slots__ = ("recorder", "name", "bytes_in", "bytes_out", "_start")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.bytes_in = None
+        self.bytes_out = None
+
+    def __enter__(self):
+        if self.recorder.trace_memory:
+            tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        peak = tracemalloc.get_traced_memory()[1] if self.recorder.trace_memory else None
+        self.recorder.record(self.name, duration, self.bytes_in, self.bytes_out, peak, failed=exc_type is not None)
+        return False
+
+
+class Instrumentation:
+    """Per-invocation stage timings emitted as CloudWatch Embedded Metric Format"""
+
+    def __init__(self, enabled=METRICS_ENABLED, trace_memory=TRACE_MEMORY, namespace=METRICS_NAMESPACE):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.namespace = namespace
+        self.stages = {}
+        self._started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return Stage(self, name)
+
+    def record(self, name, duration, bytes_in=None, bytes_out=None, peak_bytes=None, failed=False, skipped=False):
+        if not self.enabled:
+            return
+        entry = {"duration_ms": round(duration * 1000, 3)}
+        if bytes_in is not None:
+            entry["bytes_in"] = bytes_in
+        if bytes_out is not None:
+            entry["bytes_out"] = bytes_out
+        if peak_bytes is not None:
+            entry["memory_peak_bytes"] = peak_bytes
+        if failed:
+            entry["failed"] = True
+        if skipped:
+            entry["skipped"] = True
+        self.stages[name] = entry
+
+    def timings(self):
+        return dict(self.stages)
+
+    def emit(self, dimensions=None):
+        """Print one EMF line per stage for CloudWatch to turn into metrics"""
+        if not self.enabled:
+            return
+        dimensions = dict(dimensions or {})
+        timestamp = int(time.time() * 1000)
+        for name, entry in self.stages.items():
+            metrics = [{"Name": "Duration", "Unit": "Milliseconds"}]
+            record = {"Stage": name, "Duration": entry["duration_ms"]}
+            for field, metric, unit in (
+                ("bytes_in", "BytesIn", "Bytes"),
+                ("bytes_out", "BytesOut", "Bytes"),
+                ("memory_peak_bytes", "MemoryPeak", "Bytes"),
+                ("skipped", "Skipped", "Count")
+            ):
+                if field in entry:
+                    metrics.append({"Name": metric, "Unit": unit})
+                    record[metric] = int(entry[field]) if field == "skipped" else entry[field]
+            record.update(dimensions)
+            record["_aws"] = {
+                "Timestamp": timestamp,
+                "CloudWatchMetrics": [{
+                    "Namespace": self.namespace,
+                    "Dimensions": [["Stage"] + list(dimensions)],
+                    "Metrics": metrics
+                }]
+            }
+            print(json.dumps(record))
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
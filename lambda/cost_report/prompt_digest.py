@@ -0,0 +1,51 @@
+# prompt_digest.py
+import os
+
+from cost_breakdown import top_groups
+
+# Bounds that keep the digest (and the prompt) a fixed size regardless of history length
+DIGEST_RECENT_PERIODS = int(os.environ.get("DIGEST_RECENT_PERIODS", "14"))
+DIGEST_TOP_K = int(os.environ.get("DIGEST_TOP_K", "5"))
+
+
+def _window_avg(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def build_prompt_digest(series, recent_periods=DIGEST_RECENT_PERIODS, top_k=DIGEST_TOP_K):
+    """Summarise a CostSeries into a bounded dict for the Gemini prompt
+
+    Holds the covered range, the most recent periods, recent-vs-prior averages
+    and the top services and accounts, so its size does not grow with history.
+    """
+    recent = series.amounts[-recent_periods:]
+    prior = series.amounts[-2 * recent_periods:-recent_periods]
+    recent_avg = _window_avg(recent)
+    prior_avg = _window_avg(prior)
+
+    digest = {
+        "unit": series.unit,
+        "periods": series.count,
+        "first_start": series.first_start,
+        "last_end": series.last_end(),
+        "total": round(series.total, 2),
+        "mean_per_period": round(series.mean(), 2),
+        "recent_periods": [
+            {"start": start, "cost": round(amount, 2)}
+            for start, amount in zip(series.starts[-len(recent):], recent)
+        ],
+        "recent_avg": round(recent_avg, 2),
+        "prior_avg": round(prior_avg, 2),
+        "recent_change_pct": round((recent_avg - prior_avg) / prior_avg * 100, 1) if prior_avg else None,
+        "recent_min": round(min(recent), 2) if len(recent) else None,
+        "recent_max": round(max(recent), 2) if len(recent) else None
+    }
+
+    grouped_total = sum(series.service_totals.values())
+    if series.service_totals:
+        digest["top_services"] = top_groups(series.service_totals, grouped_total, top_k)
+    if series.account_totals:
+        digest["top_accounts"] = top_groups(series.account_totals, grouped_total, top_k)
+    if "total" in series.meta and not series.count:
+        digest["reported_total"] = series.meta["total"]
+    return digest
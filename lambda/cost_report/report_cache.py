@@ -0,0 +1,93 @@
+# report_cache.py
+import hashlib
+import json
+import os
+
+from botocore.exceptions import ClientError
+
+from cost_series import CostSeries
+
+# /tmp survives between warm invocations of the same container
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", "/tmp/cost-report-cache")
+
+_memory = {}
+
+
+def is_not_modified_error(error):
+    """True when an S3 ClientError is a 304 answer to a conditional request"""
+    response = getattr(error, "response", None) or {}
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    code = response.get("Error", {}).get("Code")
+    return status == 304 or code in ("304", "NotModified")
+
+
+def _cache_path(bucket, key):
+    name = hashlib.sha256(f"{bucket}/{key}".encode("utf-8")).hexdigest()
+    return os.path.join(REPORT_CACHE_DIR, f"{name}.json")
+
+
+def load_cached_report(bucket, key, params):
+    """Return the cached analysis entry for a report, if computed with the same params"""
+    entry = _memory.get((bucket, key))
+    if entry is None:
+        try:
+            with open(_cache_path(bucket, key), "r") as f:
+                entry = json.load(f)
+            _memory[(bucket, key)] = entry
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable report cache: {e}")
+            return None
+
+    if entry.get("params") != params or not entry.get("etag"):
+        return None
+    return entry
+
+
+def load_cached_series(bucket, key, entry, max_periods=None):
+    """Rebuild the cached CostSeries, or None if the entry has no usable series"""
+    try:
+        return CostSeries.from_snapshot(entry["series"], entry["meta"], max_periods)
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable series cache: {e}")
+        return None
+
+
+def store_cached_report(bucket, key, params, etag, last_modified, series, analysis, anomaly):
+    """Remember the analysis for this object version in memory and in /tmp"""
+    if not etag:
+        return
+    entry = {
+        "params": params,
+        "etag": etag,
+        "last_modified": last_modified,
+        "meta": series.meta,
+        "series": series.to_snapshot(),
+        "analysis": analysis,
+        "anomaly": anomaly
+    }
+    _memory[(bucket, key)] = entry
+    try:
+        os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+        path = _cache_path(bucket, key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️ Could not write report cache: {e}")
+
+
+def is_not_modified(s3, bucket, key, entry):
+    """Conditional GET of one byte: True if the object still has the cached ETag"""
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key, Range="bytes=0-0", IfNoneMatch=entry["etag"])
+    except ClientError as e:
+        if is_not_modified_error(e):
+            return True
+        # e.g. 416 on an empty object: treat as changed and let the full read decide
+        print(f"⚠️ Conditional GET failed, reading report: {e}")
+        return False
+    response["Body"].close()
+    return False
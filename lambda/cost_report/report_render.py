@@ -0,0 +1,298 @@
+# report_render.py
+import html
+import os
+import re
+from datetime import datetime
+
+REPORT_TITLE = "📊 AWS Cost Intelligence Report"
+TREND_EMOJIS = {"increasing": "📈", "decreasing": "📉", "stable": "➡️"}
+BUDGET_BAR_WIDTH = 20
+# Every bar a 0-100% budget can produce, built once instead of on each report
+_BUDGET_BARS = ["█" * filled + "░" * (BUDGET_BAR_WIDTH - filled) for filled in range(BUDGET_BAR_WIDTH + 1)]
+# Numeric fields the dashboard JSON sink carries alongside the formatted text
+DASHBOARD_FIELDS = (
+    "total_cost", "budget_usage", "interval_cost", "projected_monthly", "projected_monthly_low",
+    "projected_monthly_high", "trend", "forecast_model", "top_services", "top_accounts"
+)
+
+
+def create_budget_bar(percentage):
+    """Create a visual progress bar for budget"""
+    filled = int(percentage / 5)  # 20 blocks for 100%
+    if percentage < 50:
+        emoji = "🟢"
+    elif percentage < 80:
+        emoji = "🟡"
+    else:
+        emoji = "🔴"
+    bar = _BUDGET_BARS[filled] if 0 <= filled <= BUDGET_BAR_WIDTH else "█" * filled + "░" * (BUDGET_BAR_WIDTH - filled)
+    return f"{emoji} {bar} {percentage}%"
+
+
+def format_change(increase):
+    """Signed percent change for anomaly text; None means the baseline was zero"""
+    return "new spend" if increase is None else f"{increase:+}%"
+
+
+def _change_line(increase):
+    if increase is None:
+        return "🔺 *New spend* on a zero baseline"
+    if increase < 0:
+        return f"🔻 Spending fell by *{-increase}%*"
+    if increase > 0:
+        return f"🔺 Spending rose by *{increase}%*"
+    return "➡️ Spending unchanged"
+
+
+def format_anomaly_flag(anomaly):
+    """One-line anomaly summary for the batch digest
+
+    Group anomalies name the service or account that moved and its own
+    change, since the total may have gone the other way.
+    """
+    groups = anomaly.get("groups") or []
+    if anomaly["type"].startswith("group_") and groups:
+        group = groups[0]
+        return (f"{group['type'].replace('_', ' ')} in {group['dimension']} `{group['name']}` "
+                f"({format_change(group['increase'])})")
+    return f"{anomaly['type'].replace('_', ' ')} ({format_change(anomaly.get('increase'))})"
+
+
+def format_anomaly(anomaly):
+    """Slack text for an anomaly from detect_anomalies"""
+    titles = {
+        "spike": "⚠️ *COST SPIKE DETECTED*",
+        "drop": "📉 *COST DROP DETECTED*",
+        "level_shift": "📶 *COST LEVEL SHIFT DETECTED*"
+    }
+    kind = anomaly.get("type", "spike")
+    if kind in titles:
+        baseline = "Expected" if "z_score" in anomaly else "Average"
+        text = f"{titles[kind]}\n{_change_line(anomaly['increase'])}\nCurrent: ${anomaly['current']} | {baseline}: ${anomaly['average']}"
+    else:
+        text = "⚠️ *SERVICE/ACCOUNT ANOMALY DETECTED*"
+    for group in anomaly.get("groups", []):
+        text += f"\n• {group['dimension'].title()} `{group['name']}`: {group['type'].replace('_', ' ')} ${group['current']} vs ${group['expected']} expected ({format_change(group['increase'])})"
+    return text
+
+
+def build_report_view(analysis, anomaly, budget, ai_summary=None, report_name=None, now=None):
+    """Sink-independent form of one report: every field formatted once, as mrkdwn
+
+    The Slack, HTML and JSON renderers all read from this, so the
+    formatting is shared and each sink only lays the fields out.
+    """
+    total_cost = analysis.get("total_cost", 0)
+    interval_cost = analysis.get("interval_cost", 0)
+    trend = analysis.get("trend", "stable")
+    if "projected_monthly_low" in analysis:
+        projection_band = f"\n_${analysis['projected_monthly_low']} – ${analysis['projected_monthly_high']}_"
+    else:
+        projection_band = ""
+    return {
+        "title": REPORT_TITLE,
+        "report_name": report_name,
+        "anomaly": format_anomaly(anomaly) if anomaly else None,
+        "budget": f"*💳 Budget Tracker*\n```{create_budget_bar(analysis.get('budget_usage', 0))}```\n"
+                  f"Spent: *${total_cost}* of ${budget} monthly budget",
+        "ai_summary": ai_summary,
+        "metrics": [
+            ("Current Spend", f"${total_cost}"),
+            ("Interval Cost", f"${interval_cost:.4f}" if interval_cost > 0 else "N/A"),
+            ("Trend", f"{TREND_EMOJIS.get(trend, '➡️')} {trend.title()}"),
+            ("Projected Monthly", f"${analysis.get('projected_monthly', 0)}{projection_band}"),
+            ("Budget Remaining", f"${max(0, budget - total_cost)}")
+        ],
+        "top_services": [
+            f"• {group['name']}: ${group['cost']} ({group['share_pct']}%)"
+            for group in analysis.get("top_services", [])[:3]
+        ],
+        "footer": f"{'🤖 AI-Powered Analysis' if ai_summary else '📊 Metrics Report • AI summary follows'} • "
+                  f"📅 {(now or datetime.now()).strftime('%B %d, %Y at %I:%M %p UTC')}",
+        "data": dict({field: analysis[field] for field in DASHBOARD_FIELDS if field in analysis},
+                     monthly_budget=budget, anomaly=anomaly)
+    }
+
+
+def _section(text):
+    return {"type": "section", "text": {"type": "mrkdwn", "text": text}}
+
+
+def _report_name_blocks(view):
+    if view["report_name"]:
+        return ({"type": "context", "elements": [{"type": "mrkdwn", "text": f"📁 `{view['report_name']}`"}]},)
+    return ()
+
+
+def _anomaly_blocks(view):
+    return (_section(view["anomaly"]), DIVIDER) if view["anomaly"] else ()
+
+
+def _budget_blocks(view):
+    return (_section(view["budget"]),)
+
+
+def _summary_blocks(view):
+    # Omitted when the AI summary is posted separately as a follow-up
+    return (_section(view["ai_summary"]),) if view["ai_summary"] else ()
+
+
+def _metric_blocks(view):
+    fields = [{"type": "mrkdwn", "text": f"*{label}*\n{value}"} for label, value in view["metrics"]]
+    return ({"type": "section", "fields": fields},)
+
+
+def _top_service_blocks(view):
+    if not view["top_services"]:
+        return ()
+    return (_section("*🏷️ Top Services*\n" + "\n".join(view["top_services"])), DIVIDER)
+
+
+def _footer_blocks(view):
+    return ({"type": "context", "elements": [{"type": "mrkdwn", "text": view["footer"]}]},)
+
+
+# Static fragments are shared by every rendered message: never mutate them
+DIVIDER = {"type": "divider"}
+HEADER = {"type": "header", "text": {"type": "plain_text", "text": REPORT_TITLE, "emoji": True}}
+
+_slack_template = None
+
+
+def _action_buttons():
+    region = os.environ.get("AWS_REGION", "us-east-1")
+    return {
+        "type": "actions",
+        "elements": [
+            {
+                "type": "button",
+                "text": {"type": "plain_text", "text": "📊 View Details", "emoji": True},
+                "value": "view_details",
+                "url": f"https://console.aws.amazon.com/cost-management/home?region={region}#/cost-explorer"
+            },
+            {
+                "type": "button",
+                "text": {"type": "plain_text", "text": "💡 Optimization Tips", "emoji": True},
+                "value": "optimization_tips",
+                "url": "https://aws.amazon.com/aws-cost-management/cost-optimization/"
+            }
+        ]
+    }
+
+
+def slack_template():
+    """The enhanced report layout, compiled once per container
+
+    Entries are either frozen blocks, used as they are, or functions that
+    build the dynamic blocks from a report view.
+    """
+    global _slack_template
+    if _slack_template is None:
+        _slack_template = (
+            HEADER,
+            _report_name_blocks,
+            _anomaly_blocks,
+            _budget_blocks,
+            DIVIDER,
+            _summary_blocks,
+            _metric_blocks,
+            DIVIDER,
+            _top_service_blocks,
+            _action_buttons(),
+            _footer_blocks
+        )
+    return _slack_template
+
+
+def render_slack(view):
+    """Block Kit payload for a report view"""
+    blocks = []
+    for fragment in slack_template():
+        if isinstance(fragment, dict):
+            blocks.append(fragment)
+        else:
+            blocks.extend(fragment(view))
+    return {"blocks": blocks}
+
+
+_CODE_BLOCK = re.compile(r"```(.*?)```", re.S)
+_CODE = re.compile(r"`([^`]+)`")
+_BOLD = re.compile(r"\*([^*\n]+)\*")
+_ITALIC = re.compile(r"(?<!\w)_([^_\n]+)_(?!\w)")
+
+_HTML_HEAD = (
+    "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><style>"
+    "body{font-family:-apple-system,Segoe UI,sans-serif;max-width:640px;margin:auto;color:#1d1c1d}"
+    "table{border-collapse:collapse;width:100%}td{padding:6px 8px;border-bottom:1px solid #eee}"
+    "pre{background:#f6f6f6;padding:8px}.alert{border-left:4px solid #e01e5a;padding-left:12px}"
+    ".footer{color:#616061;font-size:12px}</style></head><body>"
+)
+
+
+def mrkdwn_to_html(text):
+    """Slack mrkdwn (bold, italics, code, line breaks) as escaped HTML"""
+    text = html.escape(text, quote=False)
+    text = _CODE_BLOCK.sub(r"<pre>\1</pre>", text)
+    text = _CODE.sub(r"<code>\1</code>", text)
+    text = _BOLD.sub(r"<strong>\1</strong>", text)
+    text = _ITALIC.sub(r"<em>\1</em>", text)
+    return text.replace("\n", "<br>")
+
+
+def render_html(view):
+    """Standalone HTML document for email delivery"""
+    parts = [_HTML_HEAD, f"<h2>{html.escape(view['title'])}</h2>"]
+    if view["report_name"]:
+        parts.append(f"<p><code>{html.escape(view['report_name'])}</code></p>")
+    if view["anomaly"]:
+        parts.append(f"<div class=\"alert\">{mrkdwn_to_html(view['anomaly'])}</div>")
+    parts.append(f"<p>{mrkdwn_to_html(view['budget'])}</p>")
+    if view["ai_summary"]:
+        parts.append(f"<div>{mrkdwn_to_html(view['ai_summary'])}</div>")
+    rows = "".join(f"<tr><td><strong>{html.escape(label)}</strong></td><td>{mrkdwn_to_html(value)}</td></tr>"
+                   for label, value in view["metrics"])
+    parts.append(f"<table>{rows}</table>")
+    if view["top_services"]:
+        parts.append("<h3>🏷️ Top Services</h3><p>" + "<br>".join(mrkdwn_to_html(line) for line in view["top_services"]) + "</p>")
+    parts.append(f"<p class=\"footer\">{html.escape(view['footer'])}</p></body></html>")
+    return "".join(parts)
+
+
+def render_json(view):
+    """Dashboard document: the formatted fields plus the raw numbers behind them"""
+    return {
+        "title": view["title"],
+        "report_name": view["report_name"],
+        "anomaly_text": view["anomaly"],
+        "summary": view["ai_summary"],
+        "metrics": {label: value for label, value in view["metrics"]},
+        "top_services": view["top_services"],
+        "footer": view["footer"],
+        "data": view["data"]
+    }
+
+
+RENDERERS = {"slack": render_slack, "html": render_html, "json": render_json}
+
+
+def select_sinks(sinks):
+    """Known sink names from a list or "html,json" string; unknown ones are dropped with a warning"""
+    if isinstance(sinks, str):
+        sinks = sinks.split(",")
+    selected = []
+    for sink in sinks or []:
+        sink = str(sink).strip()
+        if sink in RENDERERS:
+            if sink not in selected:
+                selected.append(sink)
+        elif sink:
+            print(f"⚠️ Ignoring unknown report sink {sink!r}, expected one of {', '.join(RENDERERS)}")
+    return selected
+
+
+def render_report(view, sink):
+    """Render a report view for one sink: "slack", "html" or "json" """
+    renderer = RENDERERS.get(sink)
+    if renderer is None:
+        raise ValueError(f"Unknown report sink {sink!r}, expected one of {', '.join(RENDERERS)}")
+    return renderer(view)
@@ -0,0 +1,270 @@
+# slack_delivery.py
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+
+from clients import http_post
+
+# "async" posts from a background worker per webhook; "sync" delivers before enqueue returns
+SLACK_DELIVERY = os.environ.get("SLACK_DELIVERY", "async").lower()
+# How long a worker waits for more messages before posting, so bursts coalesce
+SLACK_COALESCE_SECONDS = float(os.environ.get("SLACK_COALESCE_SECONDS", "0.25"))
+SLACK_MAX_ATTEMPTS = int(os.environ.get("SLACK_MAX_ATTEMPTS", "4"))
+# Full-jitter backoff: sleep uniform(0, min(max, base * 2**attempt))
+SLACK_BACKOFF_BASE_SECONDS = float(os.environ.get("SLACK_BACKOFF_BASE_SECONDS", "0.5"))
+SLACK_BACKOFF_MAX_SECONDS = float(os.environ.get("SLACK_BACKOFF_MAX_SECONDS", "8"))
+# Upper bound on how long the handler waits for queued messages before returning
+SLACK_FLUSH_TIMEOUT_SECONDS = float(os.environ.get("SLACK_FLUSH_TIMEOUT_SECONDS", "20"))
+SLACK_TIMEOUT_SECONDS = 10
+# Slack rejects messages with more than 50 blocks
+SLACK_MAX_BLOCKS = 50
+# Worst case for one post: every attempt timing out, plus the longest backoff between attempts
+# (a longer Retry-After is cut short by the delivery deadline, see SlackDelivery.begin)
+SLACK_RETRY_BUDGET_SECONDS = SLACK_MAX_ATTEMPTS * SLACK_TIMEOUT_SECONDS + sum(
+    min(SLACK_BACKOFF_MAX_SECONDS, SLACK_BACKOFF_BASE_SECONDS * 2 ** attempt) for attempt in range(SLACK_MAX_ATTEMPTS - 1)
+)
+
+
+def _backoff(attempt):
+    return random.uniform(0, min(SLACK_BACKOFF_MAX_SECONDS, SLACK_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def coalesce(messages, max_blocks=SLACK_MAX_BLOCKS):
+    """Group queued messages into as few posts as Slack's block limit allows
+
+    Block messages are joined with a divider between them; text-only
+    messages are posted on their own.
+    """
+    batches = []
+    current = []
+    size = 0
+    for message in messages:
+        blocks = message["payload"].get("blocks")
+        if not blocks:
+            batches.append([message])
+            continue
+        added = len(blocks) + (1 if current else 0)
+        if current and size + added > max_blocks:
+            batches.append(current)
+            current, size, added = [], 0, len(blocks)
+        current.append(message)
+        size += added
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _batch_payload(batch):
+    if len(batch) == 1:
+        return batch[0]["payload"]
+    blocks = []
+    for message in batch:
+        if blocks:
+            blocks.append({"type": "divider"})
+        blocks.extend(message["payload"]["blocks"])
+    return {"blocks": blocks}
+
+
+class SlackDelivery:
+    """Per-webhook message queue drained off the critical path
+
+    Each webhook gets a worker thread while it has messages. The worker
+    waits briefly so a burst coalesces into one post, honours Retry-After
+    on 429 and retries 5xx/connection errors with jittered backoff. A
+    rejected message (other 4xx) is replaced by its plain-text fallback.
+    Call begin() when an invocation starts and flush() before it returns:
+    Lambda freezes the container, and any worker with it, as soon as the
+    handler exits. Messages flush() could not deliver in time are counted
+    as failed and dropped, so a thawed worker never posts them later.
+    """
+
+    def __init__(self, mode=SLACK_DELIVERY, coalesce_seconds=SLACK_COALESCE_SECONDS):
+        self.mode = mode
+        self.coalesce_seconds = coalesce_seconds
+        self._queues = {}  # webhook -> deque of messages
+        self._workers = {}  # webhook -> Thread while one is draining
+        self._in_flight = {}  # webhook -> messages a worker has taken off its queue
+        self._stats = {"queued": 0, "posts": 0, "coalesced": 0, "retries": 0, "failed": 0}
+        self._cond = threading.Condition()
+        # Set while flush() waits: nothing more is coming, so workers skip the coalesce wait
+        self._flushing = False
+        # time.monotonic() by which posts must be done (None: no limit); see begin()
+        self._deadline = None
+        # Bumped when undelivered messages are dropped: workers of an older generation stop posting
+        self._generation = 0
+
+    def begin(self, deadline=None):
+        """Start an invocation: reset the counters and set when delivery must be done by
+
+        `deadline` is a time.monotonic() value, usually DeadlineBudget.deadline.
+        """
+        with self._cond:
+            self._abandon()
+            for name in self._stats:
+                self._stats[name] = 0
+            self._deadline = deadline
+
+    def enqueue(self, webhook_url, payload, fallback=None, label="Message"):
+        """Queue a webhook payload; fallback is the text sent if Slack rejects the blocks"""
+        if not webhook_url:
+            print(f"⚠️ No Slack webhook configured, dropping {label.lower()}")
+            return
+        message = {"payload": payload, "fallback": fallback, "label": label}
+        if self.mode == "sync":
+            with self._cond:
+                self._stats["queued"] += 1
+                generation = self._generation
+            self._deliver(webhook_url, [message], generation)
+            return
+        with self._cond:
+            self._queues.setdefault(webhook_url, deque()).append(message)
+            self._stats["queued"] += 1
+            if webhook_url not in self._workers:
+                worker = threading.Thread(target=self._drain, args=(webhook_url, self._generation), daemon=True)
+                self._workers[webhook_url] = worker
+                worker.start()
+
+    def flush(self, timeout=SLACK_FLUSH_TIMEOUT_SECONDS):
+        """Wait for every queue to drain; returns delivery counters since begin()
+
+        Messages still queued or being posted after `timeout` are dropped and
+        counted as failed (and as pending).
+        """
+        with self._cond:
+            deadline = self._deadline
+            flush_by = time.monotonic() + timeout
+            # Retry sleeps and request timeouts must not run past the flush either
+            self._deadline = flush_by if deadline is None else min(deadline, flush_by)
+            self._flushing = True
+            self._cond.notify_all()
+            drained = self._cond.wait_for(lambda: not self._workers, timeout)
+            self._flushing = False
+            self._deadline = deadline
+            pending = self._abandon()
+            stats = dict(self._stats, pending=pending)
+        if pending:
+            print(f"⚠️ Slack delivery still busy after {timeout:.1f}s, dropped {pending} undelivered messages")
+        elif not drained:
+            print(f"⚠️ Slack delivery still busy after {timeout:.1f}s")
+        return stats
+
+    def _abandon(self):
+        """Drop every queued and in-flight message as failed; call with the lock held"""
+        pending = sum(len(queue) for queue in self._queues.values()) + sum(self._in_flight.values())
+        self._stats["failed"] += pending
+        if self._workers or pending:
+            self._generation += 1
+            self._queues.clear()
+            self._workers.clear()
+            self._in_flight.clear()
+            self._cond.notify_all()
+        return pending
+
+    def _drain(self, webhook_url, generation):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._flushing or generation != self._generation, self.coalesce_seconds)
+                if generation != self._generation:
+                    return
+                self._in_flight.pop(webhook_url, None)
+                queue = self._queues[webhook_url]
+                if not queue:
+                    del self._workers[webhook_url]
+                    self._cond.notify_all()
+                    return
+                messages = list(queue)
+                queue.clear()
+                self._in_flight[webhook_url] = len(messages)
+            try:
+                self._deliver(webhook_url, messages, generation)
+            except Exception as e:
+                print(f"❌ Slack delivery worker error: {e}")
+
+    def _deliver(self, webhook_url, messages, generation):
+        for batch in coalesce(messages):
+            label = batch[0]["label"] if len(batch) == 1 else f"Digest of {len(batch)} messages"
+            status = self._post(webhook_url, _batch_payload(batch), generation)
+            if status == 200:
+                print(f"✅ {label} sent to Slack")
+            else:
+                fallbacks = [message["fallback"] for message in batch if message["fallback"]]
+                if status is not None and status < 500 and status != 429 and fallbacks:
+                    print(f"⚠️ Slack responded with {status}, sending plain-text fallback")
+                    status = self._post(webhook_url, {"text": "\n\n".join(fallbacks)}, generation)
+                if status != 200:
+                    print(f"❌ Failed to send {label.lower()} to Slack (status {status})")
+                    self._count("failed", len(batch), generation)
+            self._count("posts", 1, generation)
+            self._count("coalesced", len(batch) - 1, generation)
+            # Counted from here on by the worker itself, not by flush() if it gives up
+            self._count_done(webhook_url, len(batch), generation)
+
+    def _time_left(self, generation):
+        """Seconds before the delivery deadline; 0 once this generation's messages were dropped"""
+        with self._cond:
+            if generation != self._generation:
+                return 0.0
+            if self._deadline is None:
+                return math.inf
+            return max(0.0, self._deadline - time.monotonic())
+
+    def _post(self, webhook_url, payload, generation):
+        """POST with retries until the delivery deadline
+
+        Returns the final status code, or None if no request completed.
+        """
+        status = None
+        for attempt in range(SLACK_MAX_ATTEMPTS):
+            left = self._time_left(generation)
+            if left <= 0:
+                print("⏱️ Slack delivery deadline reached, giving up on this post")
+                return status
+            if attempt:
+                self._count("retries", 1, generation)
+            try:
+                response = http_post(webhook_url, json=payload, timeout=min(SLACK_TIMEOUT_SECONDS, left))
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ Slack post failed ({e})")
+                status = None
+                delay = _backoff(attempt)
+            else:
+                status = response.status_code
+                if status == 200:
+                    return status
+                if status == 429:
+                    delay = _retry_after(response)
+                    delay = _backoff(attempt) if delay is None else delay
+                    print(f"⏳ Slack rate limited, retrying in {delay:.1f}s")
+                elif status >= 500:
+                    delay = _backoff(attempt)
+                else:
+                    return status
+            if attempt + 1 < SLACK_MAX_ATTEMPTS:
+                # Never sleep past the deadline; flush() dropping the message wakes it early
+                delay = min(delay, self._time_left(generation))
+                with self._cond:
+                    self._cond.wait_for(lambda: generation != self._generation, delay)
+        return status
+
+    def _count(self, name, amount, generation=None):
+        with self._cond:
+            # Workers whose messages were dropped must not count into a later invocation
+            if generation is None or generation == self._generation:
+                self._stats[name] += amount
+
+    def _count_done(self, webhook_url, amount, generation):
+        with self._cond:
+            if generation == self._generation and webhook_url in self._in_flight:
+                self._in_flight[webhook_url] -= amount
@@ -0,0 +1,91 @@
+# summary_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+SUMMARY_CACHE_TTL_SECONDS = int(os.environ.get("SUMMARY_CACHE_TTL_SECONDS", "3600"))
+SUMMARY_CACHE_SIZE = int(os.environ.get("SUMMARY_CACHE_SIZE", "64"))
+# Set to an empty string to keep the cache in memory only
+SUMMARY_CACHE_DIR = os.environ.get("SUMMARY_CACHE_DIR", "/tmp/cost-summary-cache")
+
+
+def summary_fingerprint(model_name, analysis, prompt_data):
+    """Content hash of everything that goes into the Gemini prompt"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(json.dumps(analysis, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(prompt_data.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """LRU cache of AI summaries with a per-entry TTL, optionally mirrored to disk"""
+
+    def __init__(self, max_entries=SUMMARY_CACHE_SIZE, ttl=SUMMARY_CACHE_TTL_SECONDS, directory=SUMMARY_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self._entries = OrderedDict()  # fingerprint -> (created_at, summary)
+        self._lock = threading.Lock()
+
+    def _path(self, fingerprint):
+        return os.path.join(self.directory, f"{fingerprint}.json")
+
+    def get(self, fingerprint):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._entries.move_to_end(fingerprint)
+                    return entry[1]
+                del self._entries[fingerprint]
+
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(fingerprint), "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if now - stored["created_at"] >= self.ttl:
+            return None
+        self._remember(fingerprint, stored["created_at"], stored["summary"])
+        return stored["summary"]
+
+    def put(self, fingerprint, summary):
+        created_at = time.time()
+        self._remember(fingerprint, created_at, summary)
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self._path(fingerprint)}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"created_at": created_at, "summary": summary}, f)
+            os.replace(tmp_path, self._path(fingerprint))
+            self._evict_files()
+        except OSError as e:
+            print(f"⚠️ Could not write summary cache: {e}")
+
+    def _remember(self, fingerprint, created_at, summary):
+        with self._lock:
+            self._entries[fingerprint] = (created_at, summary)
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _evict_files(self):
+        """Keep at most max_entries files on disk, dropping the least recently written"""
+        names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        if len(names) <= self.max_entries:
+            return
+        paths = sorted((os.path.join(self.directory, n) for n in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,186 @@
+# summary_providers.py
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from clients import http_post
+
+# "gemini" calls the Generative Language API; "mock" answers locally for offline runs
+SUMMARY_PROVIDER = os.environ.get("SUMMARY_PROVIDER", "gemini").lower()
+# Overridable so benchmarks and tests can point at a local stand-in
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+# streamGenerateContent lets a summary cut off by the deadline still be used
+SUMMARY_STREAM = os.environ.get("SUMMARY_STREAM", "true").lower() == "true"
+# Hard bound on the time the AI summary adds to an invocation
+SUMMARY_DEADLINE_SECONDS = float(os.environ.get("SUMMARY_DEADLINE_SECONDS", "25"))
+# A second identical request is sent if the first has not answered by then (0 disables hedging)
+SUMMARY_HEDGE_AFTER_SECONDS = float(os.environ.get("SUMMARY_HEDGE_AFTER_SECONDS", "8"))
+# Streamed text shorter than this at the deadline is dropped for the fallback summary
+SUMMARY_MIN_PARTIAL_CHARS = int(os.environ.get("SUMMARY_MIN_PARTIAL_CHARS", "200"))
+MOCK_SUMMARY_LATENCY_MS = float(os.environ.get("MOCK_SUMMARY_LATENCY_MS", "0"))
+
+TRUNCATED_NOTE = "\n_…summary cut short at the deadline_"
+
+
+class SummaryError(Exception):
+    """A provider answered, but not with a summary; status is the HTTP status if it was an error"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _is_transient(error):
+    """Timeouts, 429 and 5xx may go away on a second request; other failures would repeat"""
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    status = getattr(error, "status", None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _candidate_text(data):
+    """Text of the first candidate; "" for chunks without one (usage-only or blocked)"""
+    candidates = data.get("candidates") or [{}]
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+class GeminiProvider:
+    """Gemini generateContent / streamGenerateContent over the shared HTTP session"""
+
+    name = "gemini"
+
+    def __init__(self, api_key, model_name, base_url=GEMINI_API_BASE, stream=SUMMARY_STREAM,
+                 timeout=SUMMARY_DEADLINE_SECONDS):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.base_url = base_url
+        self.stream = stream
+        self.timeout = timeout
+
+    def generate(self, prompt, on_partial=None):
+        """Full summary text; on_partial gets the text so far as streamed chunks arrive"""
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        headers = {"Content-Type": "application/json"}
+        model_url = f"{self.base_url}/v1beta/models/{self.model_name}"
+        if not self.stream:
+            response = http_post(f"{model_url}:generateContent?key={self.api_key}",
+                                 headers=headers, json=payload, timeout=self.timeout)
+            if response.status_code != 200:
+                raise SummaryError(f"Gemini API error: {response.status_code}", response.status_code)
+            text = _candidate_text(response.json())
+            if not text:
+                raise SummaryError("Gemini response had no text")
+            return text
+
+        response = http_post(f"{model_url}:streamGenerateContent?alt=sse&key={self.api_key}",
+                             headers=headers, json=payload, timeout=self.timeout, stream=True)
+        with response:
+            if response.status_code != 200:
+                raise SummaryError(f"Gemini API error: {response.status_code}", response.status_code)
+            text = ""
+            # SSE: one "data: {json}" line per chunk
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                text += _candidate_text(json.loads(line[5:]))
+                if on_partial:
+                    on_partial(text)
+        if not text:
+            raise SummaryError("Gemini stream ended without text")
+        return text
+
+
+class MockProvider:
+    """Deterministic local summary, streamed word by word over MOCK_SUMMARY_LATENCY_MS"""
+
+    name = "mock"
+
+    def __init__(self, latency_ms=MOCK_SUMMARY_LATENCY_MS):
+        self.latency_ms = latency_ms
+
+    def generate(self, prompt, on_partial=None):
+        summary = (
+            "**💰 Cost Overview**\n"
+            f"Mock summary of a {len(prompt)}-character prompt.\n\n"
+            "**📈 Key Insights**\n"
+            "• Generated offline by the mock summary provider\n"
+            "• No request was sent to an LLM\n"
+            "• Set SUMMARY_PROVIDER=gemini for real summaries\n\n"
+            "**🎯 Top 3 Recommendations**\n"
+            "1. Review the top services\n"
+            "2. Check the projection band\n"
+            "3. Tag untagged resources"
+        )
+        words = summary.split(" ")
+        delay = self.latency_ms / 1000.0 / len(words)
+        text = ""
+        for i, word in enumerate(words):
+            time.sleep(delay)
+            text = f"{text} {word}" if i else word
+            if on_partial:
+                on_partial(text)
+        return text
+
+
+def get_summary_provider(api_key, model_name, provider=SUMMARY_PROVIDER):
+    if provider == "mock":
+        return MockProvider()
+    if provider == "gemini":
+        return GeminiProvider(api_key, model_name)
+    raise ValueError(f"Unknown SUMMARY_PROVIDER {provider!r}")
+
+
+def generate_summary(provider, prompt, deadline=SUMMARY_DEADLINE_SECONDS, hedge_after=SUMMARY_HEDGE_AFTER_SECONDS):
+    """Run the provider under a deadline, hedging a slow or transiently failed first attempt
+
+    A second request goes out when the first has not answered after
+    hedge_after seconds, or fails with a timeout, 429 or 5xx; other errors
+    (bad request, auth, unusable response) would only fail again.
+
+    Returns (text, complete). At the deadline the longest streamed text is
+    returned marked incomplete, or (None, False) if there is too little of
+    it; callers then use the fallback summary. Attempts still running are
+    abandoned, bounded by the provider's own timeout.
+    """
+    best_partial = [""]
+
+    def on_partial(text):
+        if len(text) > len(best_partial[0]):
+            best_partial[0] = text
+
+    start = time.monotonic()
+    hedged = hedge_after <= 0 or hedge_after >= deadline
+    pool = ThreadPoolExecutor(max_workers=2)
+    pending = {pool.submit(provider.generate, prompt, on_partial)}
+    try:
+        while pending:
+            elapsed = time.monotonic() - start
+            if elapsed >= deadline:
+                break
+            timeout = deadline - elapsed if hedged else min(deadline, hedge_after) - elapsed
+            done, pending = wait(pending, timeout=max(0.0, timeout), return_when=FIRST_COMPLETED)
+            retry = False
+            for future in done:
+                try:
+                    return future.result(), True
+                except Exception as e:
+                    print(f"⚠️ {provider.name} summary attempt failed: {e}")
+                    retry = _is_transient(e)
+            if done and not retry:
+                hedged = True
+            if not hedged and (retry or time.monotonic() - start >= hedge_after):
+                hedged = True
+                print(f"🪁 Hedging {provider.name} summary request after {time.monotonic() - start:.1f}s")
+                pending.add(pool.submit(provider.generate, prompt, on_partial))
+    finally:
+        pool.shutdown(wait=False)
+
+    if pending:
+        print(f"⏱️ {provider.name} summary missed the {deadline}s deadline")
+    if len(best_partial[0]) >= SUMMARY_MIN_PARTIAL_CHARS:
+        return best_partial[0] + TRUNCATED_NOTE, False
+    return None, False
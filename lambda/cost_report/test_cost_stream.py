@@ -0,0 +1,47 @@
+import io
+import json
+import unittest
+
+from cost_stream import CHUNK_SIZE, iter_results_by_time
+
+ENTRY = {"TimePeriod": {"Start": "2024-01-01", "End": "2024-01-02"},
+         "Total": {"BlendedCost": {"Amount": "1.5", "Unit": "USD"}}}
+
+
+def parse(document, chunk_size):
+    meta = {}
+    entries = list(iter_results_by_time(io.BytesIO(document.encode("utf-8")), meta, chunk_size=chunk_size))
+    return entries, meta
+
+
+class ChunkBoundaryTest(unittest.TestCase):
+    """Every chunk size must give the same result as json.loads"""
+
+    def assert_sweep(self, document, sizes):
+        expected = json.loads(document)
+        expected_entries = expected.pop("ResultsByTime", [])
+        for chunk_size in sizes:
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(parse(document, chunk_size), (expected_entries, expected))
+
+    def test_top_level_numbers(self):
+        documents = [
+            '{"a":12345,"ResultsByTime":[],"b":1.5}',
+            '{"total": -1234.56e-2, "ResultsByTime": [%s], "count": 10, "ratio": 0.25E+3}' % json.dumps(ENTRY),
+            '{"ResultsByTime": [%s, %s], "total": 1234.56}' % (json.dumps(ENTRY), json.dumps(ENTRY)),
+        ]
+        for document in documents:
+            self.assert_sweep(document, range(1, len(document) + 2))
+
+    def test_number_cut_at_default_chunk_boundary(self):
+        # Pad so the "." of the total lands on the first byte of the second chunk
+        head = '{"ResultsByTime": [], "pad": "'
+        tail = '", "total": 1234.56}'
+        pad = CHUNK_SIZE - len(head) - len('", "total": 1234')
+        document = head + "x" * pad + tail
+        self.assertEqual(document.index("."), CHUNK_SIZE)
+        self.assert_sweep(document, [CHUNK_SIZE])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,18 @@
+import hashlib
 import json
 import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Reconciled rules are named <prefix><interval>m-<n> and only rules under the prefix are touched
+RECONCILE_RULE_PREFIX = os.environ.get('RECONCILE_RULE_PREFIX', 'cost-report-reconciled-')
+# EventBridge allows at most 5 targets per rule
+MAX_TARGETS_PER_RULE = 5
+RECONCILE_MAX_WORKERS = int(os.environ.get('RECONCILE_MAX_WORKERS', '4'))
+# Marks rule descriptions written by reconcile; the hash after it covers the rule and its targets
+CONFIG_MARKER = 'cfg:'
+
 def lambda_handler(event, context):
     """Dynamically create/update EventBridge rules for cost report scheduling"""
 
@@ -30,6 +40,11 @@ def lambda_handler(event, context):
     lambda_client = boto3.client('lambda')
 
     try:
+        if action == 'reconcile':
+            return reconcile_schedules(event.get('schedules', []), lambda_arn, events, lambda_client,
+                                       prefix=event.get('rule_prefix', RECONCILE_RULE_PREFIX),
+                                       prune=event.get('prune', True))
+
         if action == 'delete':
             # Delete existing rule and target
             try:
@@ -132,3 +147,209 @@ def get_current_schedule():
     except Exception as e:
         print(f"❌ Error getting current schedule: {e}")
         return {"rule_exists": False, "error": str(e)}
+
+
+def _target_id(schedule_id):
+    """EventBridge target Ids allow letters, digits, '.', '-' and '_' (64 max)"""
+    cleaned = ''.join(c if c.isalnum() or c in '.-_' else '-' for c in str(schedule_id))
+    return cleaned[:64]
+
+
+def _describe(interval, config, ids):
+    # Member Ids ride along (5 x 64 chars fits the 512 limit) so no target listing is needed
+    return f"Cost report every {interval} minutes [{CONFIG_MARKER}{config}] targets={','.join(ids)}"
+
+
+def _parse_description(description):
+    """(config hash, member target Ids) of a reconciled rule, or (None, None)"""
+    description = description or ''
+    if CONFIG_MARKER not in description:
+        return None, None
+    config = description.split(CONFIG_MARKER, 1)[1].split(']', 1)[0]
+    ids = description.split('targets=', 1)[1].split(',') if 'targets=' in description else None
+    return config, [target_id for target_id in ids if target_id] if ids is not None else None
+
+
+def desired_rules(schedules, lambda_arn, existing=None, prefix=RECONCILE_RULE_PREFIX):
+    """Pack desired schedules into rules of up to MAX_TARGETS_PER_RULE targets each
+
+    Schedules with the same interval, function and state share rules, so one
+    put_targets call covers several teams. A schedule stays in the rule that
+    already holds it, and new ones fill free slots before new rules are
+    made, so adding or removing a team only touches its own rule.
+    Returns {rule_name: rule}.
+    """
+    existing = existing or {}
+    groups = {}
+    for schedule in schedules:
+        interval = int(schedule['interval_minutes'])
+        arn = schedule.get('lambda_arn', lambda_arn)
+        state = 'ENABLED' if schedule.get('enabled', True) else 'DISABLED'
+        target_input = dict({'report_interval_minutes': interval, 'source': 'eventbridge-reconcile'},
+                            **schedule.get('input', {}))
+        groups.setdefault((interval, arn, state), {})[_target_id(schedule['id'])] = {
+            'Id': _target_id(schedule['id']),
+            'Arn': arn,
+            'Input': json.dumps(target_input, sort_keys=True)
+        }
+
+    rules = {}
+    for (interval, arn, state), targets in sorted(groups.items()):
+        # A second function gets its own rule names via a short hash of its ARN
+        owner = '' if arn == lambda_arn else '-' + hashlib.sha256(arn.encode('utf-8')).hexdigest()[:6]
+        base = f"{prefix}{interval}m{owner}{'' if state == 'ENABLED' else '-off'}-"
+
+        slots = {}
+        for name, rule in existing.items():
+            index = name[len(base):]
+            if name.startswith(base) and index.isdigit():
+                _, ids = _parse_description(rule.get('Description'))
+                slots[int(index)] = [target_id for target_id in ids or [] if target_id in targets]
+        placed = {target_id for ids in slots.values() for target_id in ids}
+        for target_id in sorted(set(targets) - placed):
+            index = next((i for i in sorted(slots) if len(slots[i]) < MAX_TARGETS_PER_RULE), None)
+            if index is None:
+                index = next(i for i in range(len(slots) + 1) if i not in slots)
+                slots[index] = []
+            slots[index].append(target_id)
+
+        expression = f"rate({interval} minute{'s' if interval != 1 else ''})"
+        for index, ids in sorted(slots.items()):
+            if not ids:
+                continue
+            ids.sort()
+            chunk = [targets[target_id] for target_id in ids]
+            config = hashlib.sha256(json.dumps([expression, state, chunk], sort_keys=True).encode('utf-8')).hexdigest()[:16]
+            rules[f"{base}{index}"] = {
+                'Name': f"{base}{index}",
+                'ScheduleExpression': expression,
+                'State': state,
+                'Description': _describe(interval, config, ids),
+                'Targets': chunk
+            }
+    return rules
+
+
+def list_managed_rules(events, prefix=RECONCILE_RULE_PREFIX):
+    """Existing rules under the prefix, from one paginated ListRules pass"""
+    rules = {}
+    for page in events.get_paginator('list_rules').paginate(NamePrefix=prefix):
+        for rule in page.get('Rules', []):
+            rules[rule['Name']] = rule
+    return rules
+
+
+def _target_ids(events, rule_name, description=None):
+    """Member Ids from the rule description, listing them only for rules without one"""
+    _, ids = _parse_description(description)
+    if ids is not None:
+        return ids, 0
+    ids = []
+    for page in events.get_paginator('list_targets_by_rule').paginate(Rule=rule_name):
+        ids.extend(target['Id'] for target in page.get('Targets', []))
+    return ids, 1
+
+
+def _apply_rule(events, rule, current):
+    """put_rule plus one batched put_targets; stale targets go first so the rule never exceeds the limit"""
+    calls = 0
+    if current is not None:
+        ids, calls = _target_ids(events, rule['Name'], current.get('Description'))
+        wanted = {target['Id'] for target in rule['Targets']}
+        stale = [target_id for target_id in ids if target_id not in wanted]
+        if stale:
+            events.remove_targets(Rule=rule['Name'], Ids=stale)
+            calls += 1
+    events.put_rule(Name=rule['Name'], ScheduleExpression=rule['ScheduleExpression'],
+                    State=rule['State'], Description=rule['Description'])
+    response = events.put_targets(Rule=rule['Name'], Targets=rule['Targets'])
+    if response.get('FailedEntryCount'):
+        raise RuntimeError(f"put_targets failed for {rule['Name']}: {response.get('FailedEntries')}")
+    return calls + 2
+
+
+def _delete_rule(events, rule):
+    ids, calls = _target_ids(events, rule['Name'], rule.get('Description'))
+    if ids:
+        events.remove_targets(Rule=rule['Name'], Ids=ids)
+        calls += 1
+    events.delete_rule(Name=rule['Name'])
+    return calls + 1
+
+
+def _ensure_permission(lambda_client, function_arn, prefix):
+    """One resource-policy statement covering every rule under the prefix"""
+    try:
+        lambda_client.add_permission(
+            FunctionName=function_arn.split(':')[-1],
+            StatementId=f"EventBridge-{prefix.strip('-')}",
+            Action='lambda:InvokeFunction',
+            Principal='events.amazonaws.com',
+            SourceArn=f"arn:aws:events:{os.environ.get('AWS_REGION', 'us-east-1')}:{os.environ.get('AWS_ACCOUNT_ID', '*')}:rule/{prefix}*"
+        )
+        print(f"✅ Added Lambda permission for rules {prefix}*")
+    except lambda_client.exceptions.ResourceConflictException:
+        pass
+
+
+def reconcile_schedules(schedules, lambda_arn, events, lambda_client, prefix=RECONCILE_RULE_PREFIX, prune=True):
+    """Make the rules under `prefix` match the desired schedules, touching only what changed
+
+    Unchanged rules are recognised by the config hash in their description,
+    so a no-op reconcile costs one ListRules pass. With prune, reconciled
+    rules that are no longer desired are deleted; rules without the config
+    marker are never touched.
+    """
+    existing = {name: rule for name, rule in list_managed_rules(events, prefix).items()
+                if _parse_description(rule.get('Description'))[0]}
+    desired = desired_rules(schedules, lambda_arn, existing, prefix)
+    api_calls = 1
+
+    to_apply = []
+    unchanged = 0
+    for name, rule in desired.items():
+        current = existing.get(name)
+        if current and _parse_description(current.get('Description'))[0] == _parse_description(rule['Description'])[0]:
+            unchanged += 1
+        else:
+            to_apply.append((rule, current))
+    to_delete = [rule for name, rule in existing.items() if prune and name not in desired]
+
+    for function_arn in {target['Arn'] for rule, _ in to_apply for target in rule['Targets']}:
+        _ensure_permission(lambda_client, function_arn, prefix)
+        api_calls += 1
+
+    errors = []
+
+    def apply(item):
+        rule, current = item
+        try:
+            return _apply_rule(events, rule, current)
+        except Exception as e:
+            errors.append({'rule_name': rule['Name'], 'message': str(e)})
+            return 0
+
+    def delete(rule):
+        try:
+            return _delete_rule(events, rule)
+        except Exception as e:
+            errors.append({'rule_name': rule['Name'], 'message': str(e)})
+            return 0
+
+    # Deletions first: a schedule moving between rules is removed from its old rule before it is added
+    with ThreadPoolExecutor(max_workers=RECONCILE_MAX_WORKERS) as pool:
+        api_calls += sum(pool.map(delete, to_delete))
+        api_calls += sum(pool.map(apply, to_apply))
+
+    print(f"✅ Reconciled {len(schedules)} schedules into {len(desired)} rules: "
+          f"{len(to_apply)} applied, {len(to_delete)} deleted, {unchanged} unchanged, {api_calls} API calls")
+    return {
+        "status": "success" if not errors else "partial",
+        "rules": len(desired),
+        "created": sorted(rule['Name'] for rule, current in to_apply if current is None),
+        "updated": sorted(rule['Name'] for rule, current in to_apply if current is not None),
+        "deleted": sorted(rule['Name'] for rule in to_delete),
+        "unchanged": unchanged,
+        "api_calls": api_calls,
+        "errors": errors
+    }